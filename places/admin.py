@@ -1,10 +1,28 @@
 from django.contrib import admin
+from django.db.models import Count
+from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
 
 from adminsortable2.admin import SortableAdminBase, SortableTabularInline
 from tinymce.widgets import TinyMCE
 
 from .models import Place, PlaceImage
+from .search import filter_places
+
+
+def format_image_preview(image, width, style):
+    """Возвращает превью из уменьшенной копии с заглушкой на фоне, пока копия загружается"""
+    background = image.dominant_color or 'transparent'
+    if image.placeholder:
+        background = f'{background} url({image.placeholder}) center / cover no-repeat'
+    return format_html(
+        '<img src="{}" width="{}" height="{}" loading="lazy" style="{} height: auto; background: {};" />',
+        image.get_variant_url(width),
+        image.width or '',
+        image.height or '',
+        style,
+        background
+    )
 
 
 class PlaceImageInline(SortableTabularInline):
@@ -18,10 +36,7 @@ class PlaceImageInline(SortableTabularInline):
     def image_preview(self, obj):
         """Показывает превью изображения в inline форме"""
         if obj.image:
-            return format_html(
-                '<img src="{}" style="max-height: 200px; max-width: 300px; object-fit: contain;" />',
-                obj.image.url
-            )
+            return format_image_preview(obj, 300, 'max-height: 200px; max-width: 300px; object-fit: contain;')
         return 'Изображение не загружено'
     
     image_preview.short_description = 'Превью'
@@ -40,6 +55,10 @@ class PlaceAdmin(SortableAdminBase, admin.ModelAdmin):
     
     search_fields = ['title', 'short_description', 'long_description']
     
+    # Подсчет изображений группирует запрос, и Django перестает применять
+    # Meta.ordering, поэтому порядок задан явно
+    ordering = ['title']
+    
     fields = [
         'title',
         'short_description', 
@@ -56,12 +75,26 @@ class PlaceAdmin(SortableAdminBase, admin.ModelAdmin):
             kwargs['widget'] = TinyMCE(attrs={'cols': 80, 'rows': 30})
         return super().formfield_for_dbfield(db_field, request, **kwargs)
     
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет места по полнотекстовому индексу вместо icontains по всем описаниям"""
+        if not search_term.strip():
+            return queryset, False
+        return filter_places(queryset, search_term), False
+    
+    def get_queryset(self, request):
+        """Считает изображения мест одним запросом вместе со списком мест, но только для списка"""
+        queryset = super().get_queryset(request)
+        changelist_url_name = f'{self.opts.app_label}_{self.opts.model_name}_changelist'
+        if request.resolver_match and request.resolver_match.url_name == changelist_url_name:
+            queryset = queryset.annotate(images_count=Count('images'))
+        return queryset
+    
     def images_count(self, obj):
         """Показывает количество изображений для места"""
-        count = obj.images.count()
-        return f'{count} изображений'
+        return f'{obj.images_count} изображений'
     
     images_count.short_description = 'Изображения'
+    images_count.admin_order_field = 'images_count'
 
 
 @admin.register(PlaceImage)
@@ -71,11 +104,13 @@ class PlaceImageAdmin(admin.ModelAdmin):
     list_display = [
         'place', 
         'order',
-        'image_preview'
+        'image_thumbnail'
     ]
     
-    list_filter = ['place']
+    list_select_related = ['place']
     
+    # Фильтр по месту в боковой панели выводил бы ссылку на каждое место,
+    # поэтому изображения места ищутся по его названию
     search_fields = ['place__title']
     
     ordering = ['place', 'order']
@@ -85,18 +120,36 @@ class PlaceImageAdmin(admin.ModelAdmin):
     fields = [
         'place',
         'image',
-        'image_preview'
+        'image_preview',
+        'image_info'
     ]
     
-    readonly_fields = ['image_preview']
+    readonly_fields = ['image_preview', 'image_info']
     
     def image_preview(self, obj):
         """Показывает превью изображения"""
         if obj.image:
-            return format_html(
-                '<img src="{}" style="max-height: 200px; max-width: 400px; object-fit: contain; border: 1px solid #ddd; border-radius: 4px;" />',
-                obj.image.url
+            return format_image_preview(
+                obj,
+                600,
+                'max-height: 200px; max-width: 400px; object-fit: contain; border: 1px solid #ddd; border-radius: 4px;'
             )
         return 'Нет изображения'
     
-    image_preview.short_description = 'Превью'
\ No newline at end of file
+    image_preview.short_description = 'Превью'
+    
+    def image_thumbnail(self, obj):
+        """Показывает в списке маленькую копию изображения вместо оригинала"""
+        if obj.image:
+            return format_image_preview(obj, 300, 'max-height: 80px; max-width: 120px; object-fit: contain;')
+        return 'Нет изображения'
+    
+    image_thumbnail.short_description = 'Превью'
+    
+    def image_info(self, obj):
+        """Показывает сохранённые размеры изображения, не открывая сам файл"""
+        if obj.width is None:
+            return 'Изображение ещё не обработано'
+        return f'{obj.width}×{obj.height}, {filesizeformat(obj.file_size)}, основной цвет {obj.dominant_color}'
+    
+    image_info.short_description = 'Параметры'
\ No newline at end of file
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class PlacesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'places'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .metrics import install_queries_collector
+
+        connection_created.connect(install_queries_collector, dispatch_uid='places_queries_collector')
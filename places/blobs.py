@@ -0,0 +1,36 @@
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+
+
+IMAGE_BLOBS_DIR = 'images'
+
+
+def get_image_blob_name(content_hash, filename):
+    """Возвращает путь файла изображения в хранилище по SHA-256 его содержимого"""
+    extension = os.path.splitext(filename)[1].lower()
+    return os.path.join(IMAGE_BLOBS_DIR, content_hash[:2], content_hash[2:4], f'{content_hash}{extension}')
+
+
+def is_image_blob(name):
+    """Проверяет, что файл хранится по адресу из SHA-256 и может использоваться несколькими изображениями"""
+    return name.startswith(f'{IMAGE_BLOBS_DIR}/')
+
+
+def save_image_blob(file, filename, content_hash=None):
+    """Сохраняет файл изображения по адресу из SHA-256, если его там еще нет, и возвращает имя файла и SHA-256"""
+    if content_hash is None:
+        content_hash = _get_content_hash(file)
+
+    name = get_image_blob_name(content_hash, filename)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, file)
+    return name, content_hash
+
+
+def _get_content_hash(file):
+    content_hash = hashlib.sha256()
+    for chunk in file.chunks():
+        content_hash.update(chunk)
+    return content_hash.hexdigest()
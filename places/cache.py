@@ -0,0 +1,200 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+
+from .compression import compress_content
+from .models import Place
+from .serializers import dump_place_details
+
+
+DATA_STATE_KEY = 'places:data_state'
+
+DETAILS_EPOCH_KEY = 'places:details_epoch'
+
+# Версия формата ответов GeoJSON, кластеров, поиска и деталей мест. Версия данных
+# переживает деплой, поэтому при изменении формата ответов её нужно увеличить:
+# она входит в ETag и ключи кэша, и клиенты не получат 304 на ответ старого формата.
+PAYLOAD_FORMAT_VERSION = 1
+
+# Сколько мест сбрасывается по отдельности; при большем числе меняется эпоха деталей
+DETAILS_GENERATIONS_LIMIT = 20
+
+# Версия данных и поколения деталей мест хранятся в отдельном общем для всех
+# процессов кэше: ответы могут лежать в памяти каждого процесса, а при чистке
+# переполненного кэша ответов состояние удалялось бы вместе с ними.
+DATA_STATE_CACHE_ALIAS = 'places_state'
+
+_process_payloads = {}
+
+
+def get_data_state():
+    """Возвращает текущую версию данных о местах и время их последнего изменения"""
+    state_cache = caches[DATA_STATE_CACHE_ALIAS]
+    state = state_cache.get(DATA_STATE_KEY)
+    if state is None:
+        state = {'version': time.time_ns(), 'modified': timezone.now()}
+        if not state_cache.add(DATA_STATE_KEY, state, timeout=None):
+            state = state_cache.get(DATA_STATE_KEY, state)
+    return state
+
+
+def get_data_version():
+    """Возвращает текущую версию данных о местах"""
+    return get_data_state()['version']
+
+
+def bump_data_version():
+    """Выпускает новую версию данных о местах, делая устаревшими закэшированные ответы"""
+    caches[DATA_STATE_CACHE_ALIAS].set(
+        DATA_STATE_KEY,
+        {'version': time.time_ns(), 'modified': timezone.now()},
+        timeout=None
+    )
+
+
+def get_versioned_payload(name, build_content):
+    """Возвращает закэшированные для текущей версии данных байты ответа и их ETag"""
+    return _get_cached_payload(f'places:{name}:{PAYLOAD_FORMAT_VERSION}:{get_data_version()}', build_content)
+
+
+def get_process_payload(name, build_content):
+    """Возвращает байты ответа, который меняется только при деплое, собирая их раз за время жизни процесса"""
+    payload = _process_payloads.get(name)
+    if payload is None or settings.DEBUG:
+        payload = _process_payloads[name] = _make_payload(build_content())
+    return payload
+
+
+def clear_process_payloads():
+    """Удаляет ответы, собранные процессом через get_process_payload"""
+    _process_payloads.clear()
+
+
+def get_data_version_etag(request, *args, **kwargs):
+    """Возвращает ETag ответа, который зависит только от данных о местах, формата ответа и URL"""
+    return f'{PAYLOAD_FORMAT_VERSION}-{get_data_version()}'
+
+
+def get_data_last_modified(request, *args, **kwargs):
+    """Возвращает время последнего изменения данных о местах"""
+    return get_data_state()['modified']
+
+
+def get_place_details_payload(place_id):
+    """Возвращает закэшированные байты JSON с деталями места и их ETag или None, если места нет"""
+    return get_places_details_payloads([place_id]).get(place_id)
+
+
+async def aget_place_details_payload(place_id):
+    """Асинхронная версия get_place_details_payload, загружающая место через асинхронный ORM"""
+    key = (await _aget_places_details_keys([place_id]))[place_id]
+    payload = await cache.aget(key)
+    if payload is None:
+        place = await Place.objects.filter(id=place_id).prefetch_related('images').afirst()
+        if place is None:
+            return None
+        payload = _make_payload(dump_place_details(place))
+        await cache.aset(key, payload, timeout=settings.PLACES_CACHE_TIMEOUT)
+    return payload
+
+
+def get_places_details_payloads(place_ids):
+    """Возвращает словарь {ID: закэшированные байты JSON с деталями места и их ETag} для найденных мест"""
+    keys = _get_places_details_keys(place_ids)
+    cached_payloads = cache.get_many(keys.values())
+    payloads = {
+        place_id: cached_payloads[key]
+        for place_id, key in keys.items()
+        if key in cached_payloads
+    }
+
+    # Недостающие в кэше места загружаются одним запросом мест и одним запросом изображений
+    missing_ids = [place_id for place_id in place_ids if place_id not in payloads]
+    if missing_ids:
+        places = Place.objects.filter(id__in=missing_ids).prefetch_related('images')
+        built_payloads = {
+            place.id: _make_payload(dump_place_details(place))
+            for place in places
+        }
+        cache.set_many(
+            {keys[place_id]: payload for place_id, payload in built_payloads.items()},
+            timeout=settings.PLACES_CACHE_TIMEOUT
+        )
+        payloads.update(built_payloads)
+
+    return payloads
+
+
+def invalidate_place_details(place_id):
+    """Сбрасывает закэшированный JSON с деталями места, выпуская новое поколение его ключа"""
+    old_key = _get_places_details_keys([place_id])[place_id]
+    # Поколение живет дольше ответов: когда оно истечет и место вернется к
+    # нулевому поколению, ответов со старыми ключами в кэше уже не останется
+    caches[DATA_STATE_CACHE_ALIAS].set(
+        _get_place_details_generation_key(place_id),
+        time.time_ns(),
+        timeout=settings.PLACES_CACHE_TIMEOUT * 2
+    )
+    cache.delete(old_key)
+
+
+def invalidate_places_details(place_ids):
+    """Сбрасывает закэшированный JSON с деталями нескольких мест, при большом их числе меняя общую эпоху деталей"""
+    place_ids = set(place_ids)
+    if len(place_ids) > DETAILS_GENERATIONS_LIMIT:
+        caches[DATA_STATE_CACHE_ALIAS].set(DETAILS_EPOCH_KEY, time.time_ns(), timeout=None)
+        return
+    for place_id in place_ids:
+        invalidate_place_details(place_id)
+
+
+def _get_places_details_keys(place_ids):
+    state = caches[DATA_STATE_CACHE_ALIAS].get_many(_get_details_state_keys(place_ids))
+    return _make_places_details_keys(place_ids, state)
+
+
+async def _aget_places_details_keys(place_ids):
+    state = await caches[DATA_STATE_CACHE_ALIAS].aget_many(_get_details_state_keys(place_ids))
+    return _make_places_details_keys(place_ids, state)
+
+
+def _get_details_state_keys(place_ids):
+    return [DETAILS_EPOCH_KEY, *(_get_place_details_generation_key(place_id) for place_id in place_ids)]
+
+
+def _make_places_details_keys(place_ids, state):
+    """Возвращает {ID: ключ кэша деталей места} по эпохе деталей и поколениям мест из общего состояния"""
+    # Поколение читается до загрузки места, поэтому детали, собранные из успевших
+    # измениться данных, сохраняются под устаревшим ключом и никому не отдаются
+    epoch = state.get(DETAILS_EPOCH_KEY, 0)
+    return {
+        place_id: (
+            f'places:details:{PAYLOAD_FORMAT_VERSION}:{place_id}:{epoch}:'
+            f'{state.get(_get_place_details_generation_key(place_id), 0)}'
+        )
+        for place_id in place_ids
+    }
+
+
+def _get_place_details_generation_key(place_id):
+    return f'places:details_generation:{place_id}'
+
+
+def _get_cached_payload(key, build_content):
+    payload = cache.get(key)
+    if payload is None:
+        payload = _make_payload(build_content())
+        cache.set(key, payload, timeout=settings.PLACES_CACHE_TIMEOUT)
+    return payload
+
+
+def _make_payload(content):
+    # Сжатые копии рассчитываются один раз вместе с payload и хранятся рядом с ним в кэше
+    return {
+        'content': content,
+        'etag': hashlib.md5(content).hexdigest(),
+        'encodings': compress_content(content)
+    }
@@ -0,0 +1,179 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .geo import TILE_SIZE, get_grid_cell, get_grid_cell_bounds, get_grid_ranges
+from .models import Place, PlaceCluster
+
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+
+CELL_SIZE = 64
+
+
+def get_cells_count(zoom):
+    """Возвращает количество ячеек кластеризации по одной оси на уровне масштаба"""
+    return TILE_SIZE * 2 ** zoom // CELL_SIZE
+
+
+def get_place_cell(latitude, longitude, zoom):
+    """Возвращает ячейку кластеризации, в которую попадает место"""
+    return get_grid_cell(float(latitude), float(longitude), get_cells_count(zoom))
+
+
+def build_clusters(places):
+    """Рассчитывает кластеры всех уровней масштаба для пар (id, широта, долгота)"""
+    clusters = defaultdict(lambda: {
+        'places_count': 0,
+        'latitude_sum': 0.0,
+        'longitude_sum': 0.0,
+        'place_id': None
+    })
+
+    for place_id, latitude, longitude in places:
+        latitude, longitude = float(latitude), float(longitude)
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            cell_x, cell_y = get_place_cell(latitude, longitude, zoom)
+            cluster = clusters[zoom, cell_x, cell_y]
+            cluster['places_count'] += 1
+            cluster['latitude_sum'] += latitude
+            cluster['longitude_sum'] += longitude
+            cluster['place_id'] = place_id if cluster['places_count'] == 1 else None
+
+    return clusters
+
+
+def rebuild_clusters():
+    """Полностью пересчитывает кластеры по всем местам"""
+    clusters = build_clusters(Place.objects.values_list('id', 'latitude', 'longitude'))
+
+    with transaction.atomic():
+        PlaceCluster.objects.all().delete()
+        PlaceCluster.objects.bulk_create(
+            [
+                PlaceCluster(zoom=zoom, cell_x=cell_x, cell_y=cell_y, **cluster)
+                for (zoom, cell_x, cell_y), cluster in clusters.items()
+            ],
+            batch_size=1000
+        )
+
+    return len(clusters)
+
+
+def add_place_to_clusters(place):
+    """Добавляет место в кластеры всех уровней масштаба"""
+    latitude, longitude = float(place.latitude), float(place.longitude)
+
+    with transaction.atomic():
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            cell_x, cell_y = get_place_cell(latitude, longitude, zoom)
+            _add_to_cluster(zoom, cell_x, cell_y, place.id, latitude, longitude)
+
+
+def remove_place_from_clusters(place_id, latitude, longitude):
+    """Удаляет место из кластеров всех уровней масштаба"""
+    latitude, longitude = float(latitude), float(longitude)
+
+    with transaction.atomic():
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            cell_x, cell_y = get_place_cell(latitude, longitude, zoom)
+            _remove_from_cluster(zoom, cell_x, cell_y, place_id, latitude, longitude)
+
+
+def move_place_in_clusters(place, old_latitude, old_longitude):
+    """Переносит место между кластерами после изменения его координат"""
+    old_latitude, old_longitude = float(old_latitude), float(old_longitude)
+    latitude, longitude = float(place.latitude), float(place.longitude)
+
+    with transaction.atomic():
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            old_cell = get_place_cell(old_latitude, old_longitude, zoom)
+            new_cell = get_place_cell(latitude, longitude, zoom)
+
+            if old_cell == new_cell:
+                _shift_cluster(zoom, *new_cell, latitude - old_latitude, longitude - old_longitude)
+                continue
+
+            _remove_from_cluster(zoom, *old_cell, place.id, old_latitude, old_longitude)
+            _add_to_cluster(zoom, *new_cell, place.id, latitude, longitude)
+
+
+def _add_to_cluster(zoom, cell_x, cell_y, place_id, latitude, longitude):
+    updated = PlaceCluster.objects.filter(zoom=zoom, cell_x=cell_x, cell_y=cell_y).update(
+        places_count=F('places_count') + 1,
+        latitude_sum=F('latitude_sum') + latitude,
+        longitude_sum=F('longitude_sum') + longitude,
+        place=None
+    )
+    if not updated:
+        PlaceCluster.objects.create(
+            zoom=zoom,
+            cell_x=cell_x,
+            cell_y=cell_y,
+            places_count=1,
+            latitude_sum=latitude,
+            longitude_sum=longitude,
+            place_id=place_id
+        )
+
+
+def _remove_from_cluster(zoom, cell_x, cell_y, place_id, latitude, longitude):
+    cluster = PlaceCluster.objects.filter(zoom=zoom, cell_x=cell_x, cell_y=cell_y).first()
+    if not cluster:
+        return
+
+    if cluster.places_count <= 1:
+        cluster.delete()
+        return
+
+    cluster.places_count -= 1
+    cluster.latitude_sum -= latitude
+    cluster.longitude_sum -= longitude
+    cluster.place_id = None
+
+    if cluster.places_count == 1:
+        west, south, east, north = get_grid_cell_bounds(cell_x, cell_y, get_cells_count(zoom))
+        candidates = Place.objects.filter(
+            latitude__gte=south,
+            latitude__lte=north,
+            longitude__gte=west,
+            longitude__lte=east
+        ).exclude(id=place_id).only('id', 'latitude', 'longitude')
+        for candidate in candidates:
+            if get_place_cell(candidate.latitude, candidate.longitude, zoom) == (cell_x, cell_y):
+                cluster.place_id = candidate.id
+                cluster.latitude_sum = float(candidate.latitude)
+                cluster.longitude_sum = float(candidate.longitude)
+                break
+
+    cluster.save()
+
+
+def _shift_cluster(zoom, cell_x, cell_y, latitude_delta, longitude_delta):
+    PlaceCluster.objects.filter(zoom=zoom, cell_x=cell_x, cell_y=cell_y).update(
+        latitude_sum=F('latitude_sum') + latitude_delta,
+        longitude_sum=F('longitude_sum') + longitude_delta
+    )
+
+
+def get_clusters_in_bbox(bbox, zoom):
+    """Возвращает кластеры уровня масштаба, попадающие в bbox"""
+    x_ranges, (min_y, max_y) = get_grid_ranges(bbox, get_cells_count(zoom))
+
+    clusters = []
+    for min_x, max_x in x_ranges:
+        clusters.extend(
+            PlaceCluster.objects.filter(
+                zoom=zoom,
+                cell_x__gte=min_x,
+                cell_x__lte=max_x,
+                cell_y__gte=min_y,
+                cell_y__lte=max_y
+            ).select_related('place').only(
+                'zoom', 'cell_x', 'cell_y', 'places_count', 'latitude_sum', 'longitude_sum',
+                'place__id', 'place__title', 'place__latitude', 'place__longitude'
+            )
+        )
+    return clusters
@@ -0,0 +1,56 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+GZIP_LEVEL = 9
+
+BROTLI_QUALITY = 9
+
+# Сжимать ответы меньше этого размера нет смысла: заголовки сжатого ответа съедят выигрыш
+MIN_COMPRESS_SIZE = 200
+
+# Порядок предпочтения: brotli сжимает JSON лучше gzip
+ENCODINGS = ('br', 'gzip')
+
+
+def compress_content(content):
+    """Сжимает содержимое всеми доступными способами и возвращает словарь {кодировка: байты}"""
+    if len(content) < MIN_COMPRESS_SIZE:
+        return {}
+
+    encodings = {'gzip': gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)}
+    if brotli:
+        encodings['br'] = brotli.compress(content, quality=BROTLI_QUALITY)
+    return encodings
+
+
+def get_accepted_encodings(request):
+    """Возвращает кодировки из заголовка Accept-Encoding, которые клиент не запретил через q=0"""
+    accepted = set()
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip().replace(' ', '')
+        if quality.startswith('q=') and _is_zero(quality[2:]):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def choose_encoding(request, encodings):
+    """Выбирает лучшую из заранее сжатых копий, которую принимает клиент, или None"""
+    accepted = get_accepted_encodings(request)
+    for encoding in ENCODINGS:
+        if encoding in encodings and encoding in accepted:
+            return encoding
+    return None
+
+
+def _is_zero(raw_quality):
+    try:
+        return float(raw_quality) == 0
+    except ValueError:
+        return False
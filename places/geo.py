@@ -0,0 +1,141 @@
+import math
+
+
+TILE_SIZE = 256
+
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+EARTH_RADIUS = 6371008.8
+
+# Сетка для поиска ближайших мест: ячейки по 0.1 градуса (около 11 км по широте)
+NEARBY_CELL_SIZE = 0.1
+NEARBY_ROWS = 1800
+NEARBY_COLUMNS = 3600
+
+
+def parse_bbox(raw_bbox):
+    """Разбирает строку bbox вида "west,south,east,north" в кортеж чисел"""
+    parts = raw_bbox.split(',')
+    if len(parts) != 4:
+        raise ValueError('bbox должен содержать 4 числа: west,south,east,north')
+
+    try:
+        west, south, east, north = (float(part) for part in parts)
+    except ValueError:
+        raise ValueError('bbox должен содержать только числа')
+
+    if south > north:
+        raise ValueError('Южная граница bbox больше северной')
+
+    south = max(south, -90.0)
+    north = min(north, 90.0)
+
+    if east - west >= 360:
+        return -180.0, south, 180.0, north
+
+    west = normalize_longitude(west)
+    east = normalize_longitude(east)
+    return west, south, east, north
+
+
+def normalize_longitude(longitude):
+    """Приводит долготу к диапазону [-180, 180]"""
+    if -180 <= longitude <= 180:
+        return longitude
+    return (longitude + 180) % 360 - 180
+
+
+def project(latitude, longitude):
+    """Переводит координаты в нормированные координаты Web Mercator [0, 1)"""
+    latitude = min(max(latitude, -MAX_MERCATOR_LATITUDE), MAX_MERCATOR_LATITUDE)
+    x = (longitude + 180) / 360
+    sin_latitude = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi)
+    return min(max(x, 0.0), 1 - 1e-12), min(max(y, 0.0), 1 - 1e-12)
+
+
+def unproject(x, y):
+    """Переводит нормированные координаты Web Mercator обратно в широту и долготу"""
+    longitude = x * 360 - 180
+    latitude = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return latitude, longitude
+
+
+def get_grid_cell(latitude, longitude, cells_count):
+    """Возвращает ячейку сетки cells_count x cells_count, в которую попадает точка"""
+    x, y = project(latitude, longitude)
+    return int(x * cells_count), int(y * cells_count)
+
+
+def get_grid_cell_bounds(cell_x, cell_y, cells_count):
+    """Возвращает границы ячейки сетки в виде (west, south, east, north)"""
+    north, west = unproject(cell_x / cells_count, cell_y / cells_count)
+    south, east = unproject((cell_x + 1) / cells_count, (cell_y + 1) / cells_count)
+    return west, south, east, north
+
+
+def get_grid_ranges(bbox, cells_count):
+    """Возвращает диапазоны ячеек сетки (по x и по y), покрывающие bbox"""
+    west, south, east, north = bbox
+    min_x, min_y = get_grid_cell(north, west, cells_count)
+    max_x, max_y = get_grid_cell(south, east, cells_count)
+
+    y_range = (min_y, max_y)
+    if west <= east:
+        return [(min_x, max_x)], y_range
+    return [(min_x, cells_count - 1), (0, max_x)], y_range
+
+
+def get_tile_bbox(zoom, tile_x, tile_y):
+    """Возвращает границы тайла карты в виде (west, south, east, north)"""
+    return get_grid_cell_bounds(tile_x, tile_y, 2 ** zoom)
+
+
+def get_nearby_cell(latitude, longitude):
+    """Возвращает номер ячейки сетки поиска ближайших мест, в которую попадает точка"""
+    row = min(int((float(latitude) + 90) / NEARBY_CELL_SIZE), NEARBY_ROWS - 1)
+    column = min(int((normalize_longitude(float(longitude)) + 180) / NEARBY_CELL_SIZE), NEARBY_COLUMNS - 1)
+    return row * NEARBY_COLUMNS + column
+
+
+def get_nearby_cell_ranges(latitude, longitude, radius):
+    """Возвращает диапазоны номеров ячеек сетки, покрывающих круг радиуса radius метров вокруг точки"""
+    angular_radius = radius / EARTH_RADIUS
+    south = latitude - math.degrees(angular_radius)
+    north = latitude + math.degrees(angular_radius)
+
+    column_ranges = [(0, NEARBY_COLUMNS - 1)]
+    if south > -90 and north < 90 and math.sin(angular_radius) < math.cos(math.radians(latitude)):
+        longitude_delta = math.degrees(math.asin(math.sin(angular_radius) / math.cos(math.radians(latitude))))
+        west, east = longitude - longitude_delta, longitude + longitude_delta
+        if east - west < 360:
+            column_ranges = _get_nearby_column_ranges(normalize_longitude(west), normalize_longitude(east))
+
+    first_row = get_nearby_cell(max(south, -90), 0) // NEARBY_COLUMNS
+    last_row = get_nearby_cell(min(north, 90), 0) // NEARBY_COLUMNS
+    # В пределах строки сетки номера ячеек идут подряд, и диапазон читается из индекса одним интервалом
+    return [
+        (row * NEARBY_COLUMNS + first_column, row * NEARBY_COLUMNS + last_column)
+        for row in range(first_row, last_row + 1)
+        for first_column, last_column in column_ranges
+    ]
+
+
+def get_distance(latitude1, longitude1, latitude2, longitude2):
+    """Возвращает расстояние между двумя точками по поверхности Земли в метрах"""
+    latitude1, longitude1, latitude2, longitude2 = map(
+        math.radians, (latitude1, longitude1, latitude2, longitude2)
+    )
+    haversine = (
+        math.sin((latitude2 - latitude1) / 2) ** 2
+        + math.cos(latitude1) * math.cos(latitude2) * math.sin((longitude2 - longitude1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(haversine)))
+
+
+def _get_nearby_column_ranges(west, east):
+    first_column = get_nearby_cell(0, west) % NEARBY_COLUMNS
+    last_column = get_nearby_cell(0, east) % NEARBY_COLUMNS
+    if first_column <= last_column:
+        return [(first_column, last_column)]
+    return [(first_column, NEARBY_COLUMNS - 1), (0, last_column)]
@@ -0,0 +1,89 @@
+import base64
+import io
+import os
+
+from PIL import Image, ImageOps
+
+
+VARIANT_WIDTHS = (300, 600, 1200)
+
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+VARIANT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_FORMAT = {'format': 'WEBP', 'quality': 50}
+
+DOMINANT_COLOR_SAMPLE_SIZE = 64
+DOMINANT_COLOR_PALETTE_SIZE = 5
+
+
+def get_variant_widths(width):
+    """Возвращает ширины уменьшенных копий для изображения заданной ширины, не увеличивая его"""
+    return [variant_width for variant_width in VARIANT_WIDTHS if variant_width < width] or [width]
+
+
+def process_image(source):
+    """Рассчитывает метаданные и уменьшенные копии изображения по пути к файлу или его байтам; выполняется в процессах пула"""
+    if isinstance(source, bytes):
+        file_size = len(source)
+        source = io.BytesIO(source)
+    else:
+        file_size = os.path.getsize(source)
+
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        return {
+            'width': image.width,
+            'height': image.height,
+            'file_size': file_size,
+            'dominant_color': get_dominant_color(image),
+            'placeholder': render_placeholder(image),
+            'variants': render_image_variants(image),
+        }
+
+
+def render_image_variants(image):
+    """Рассчитывает уменьшенные копии изображения во всех форматах в виде списка (ширина, формат, байты)"""
+    variants = []
+    for width in get_variant_widths(image.width):
+        resized = image if width == image.width else _resize(image, width)
+        for variant_format, params in VARIANT_FORMATS.items():
+            variants.append((width, variant_format, _encode_image(resized, params)))
+    return variants
+
+
+def get_dominant_color(image):
+    """Возвращает самый частый цвет уменьшенного изображения в виде #rrggbb"""
+    sample = image.convert('RGB')
+    sample.thumbnail((DOMINANT_COLOR_SAMPLE_SIZE, DOMINANT_COLOR_SAMPLE_SIZE))
+    palette_image = sample.quantize(DOMINANT_COLOR_PALETTE_SIZE)
+    _, index = max(palette_image.getcolors())
+    red, green, blue = palette_image.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def render_placeholder(image):
+    """Возвращает крошечную размытую при растягивании копию изображения в виде data URI"""
+    placeholder = _resize(image, min(PLACEHOLDER_WIDTH, image.width))
+    content = _encode_image(placeholder, PLACEHOLDER_FORMAT)
+    return f'data:image/webp;base64,{base64.b64encode(content).decode("ascii")}'
+
+
+def _resize(image, width):
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode_image(image, params):
+    if params['format'] == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, **params)
+    return output.getvalue()
@@ -0,0 +1,183 @@
+import contextlib
+import json
+import statistics
+import sys
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .metrics import QueriesCollector, current_queries_collector
+
+
+PHASES = ('fetch', 'db', 'download', 'storage', 'processing')
+
+PHASE_TITLES = {
+    'fetch': 'Чтение и разбор JSON',
+    'db': 'SQL-запросы',
+    'download': 'Скачивание изображений',
+    'storage': 'Запись в хранилище',
+    'processing': 'Обработка изображений',
+}
+
+
+class FileImportStats:
+    """Время этапов загрузки одного файла или пакета мест, скачанные изображения и их задержки"""
+
+    def __init__(self, name):
+        self.name = name
+        # Время скачивания и записи складывается по всем потокам и может превышать wall
+        self.phases = defaultdict(float)
+        self.images = 0
+        self.downloaded_bytes = 0
+        self.download_latencies = []
+        self.wall = 0.0
+        self._lock = threading.Lock()
+        self._started = perf_counter()
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def add_download(self, size, seconds):
+        with self._lock:
+            self.images += 1
+            self.downloaded_bytes += size
+            self.download_latencies.append(seconds)
+            self.phases['download'] += seconds
+
+    @contextlib.contextmanager
+    def measure(self, phase):
+        """Учитывает время выполнения блока в этапе phase"""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, perf_counter() - started)
+
+    @contextlib.contextmanager
+    def measure_queries(self):
+        """Учитывает время SQL-запросов, выполненных в блоке в текущем потоке, в этапе db"""
+        collector = QueriesCollector()
+        token = current_queries_collector.set(collector)
+        try:
+            yield
+        finally:
+            current_queries_collector.reset(token)
+            self.add_time('db', collector.duration)
+
+    def finish(self):
+        self.wall = perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'wall_seconds': round(self.wall, 4),
+            'phases_seconds': {phase: round(self.phases[phase], 4) for phase in PHASES},
+            'images': self.images,
+            'downloaded_bytes': self.downloaded_bytes,
+        }
+
+
+class ImportStats:
+    """Сводка загрузки мест: этапы по файлам и суммарно, пропускная способность и пиковая память"""
+
+    def __init__(self):
+        self.files = []
+        self.batches = []
+        self.wall = 0.0
+        self._lock = threading.Lock()
+        self._started = perf_counter()
+
+    def add_file(self, name):
+        """Начинает учет загрузки файла и возвращает его FileImportStats"""
+        file_stats = FileImportStats(name)
+        with self._lock:
+            self.files.append(file_stats)
+        return file_stats
+
+    def add_batch(self, name):
+        """Начинает учет пакетной загрузки нескольких мест и возвращает ее FileImportStats"""
+        batch_stats = FileImportStats(name)
+        with self._lock:
+            self.batches.append(batch_stats)
+        return batch_stats
+
+    def finish(self):
+        self.wall = perf_counter() - self._started
+
+    def to_dict(self):
+        entries = self.files + self.batches
+        phases = {phase: sum(entry.phases[phase] for entry in entries) for phase in PHASES}
+        images = sum(entry.images for entry in entries)
+        downloaded_bytes = sum(entry.downloaded_bytes for entry in entries)
+        latencies = sorted(latency for entry in entries for latency in entry.download_latencies)
+        wall = self.wall or 1e-9
+
+        return {
+            'wall_seconds': round(self.wall, 4),
+            'phases_seconds': {phase: round(seconds, 4) for phase, seconds in phases.items()},
+            'images': images,
+            'downloaded_bytes': downloaded_bytes,
+            'download_latency_ms': {
+                'p50': round(statistics.median(latencies) * 1000, 2),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2),
+            } if latencies else None,
+            'throughput': {
+                'files_per_second': round(len(self.files) / wall, 2),
+                'images_per_second': round(images / wall, 2),
+                'download_megabytes_per_second': round(downloaded_bytes / 1024 / 1024 / wall, 2),
+            },
+            'peak_memory_kb': get_peak_memory_kb(),
+            'files': [file_stats.to_dict() for file_stats in self.files],
+            'batches': [batch_stats.to_dict() for batch_stats in self.batches],
+        }
+
+    def format_summary(self):
+        """Возвращает строки сводки для вывода в консоль"""
+        report = self.to_dict()
+        lines = [f'Общее время: {report["wall_seconds"]:.2f} с']
+        for phase in PHASES:
+            lines.append(f'  {PHASE_TITLES[phase]}: {report["phases_seconds"][phase]:.2f} с')
+
+        lines.append(
+            f'Изображений скачано: {report["images"]}, '
+            f'{report["downloaded_bytes"] / 1024 / 1024:.1f} МБ'
+        )
+        if report['download_latency_ms']:
+            latency = report['download_latency_ms']
+            lines.append(
+                f'Задержка скачивания: p50 {latency["p50"]:.0f} мс, '
+                f'p95 {latency["p95"]:.0f} мс, макс. {latency["max"]:.0f} мс'
+            )
+
+        throughput = report['throughput']
+        lines.append(
+            f'Пропускная способность: {throughput["files_per_second"]:.2f} файлов/с, '
+            f'{throughput["images_per_second"]:.2f} изображений/с, '
+            f'{throughput["download_megabytes_per_second"]:.2f} МБ/с'
+        )
+        if report['peak_memory_kb'] is not None:
+            lines.append(f'Пиковая память процесса: {report["peak_memory_kb"] / 1024:.1f} МБ')
+        return lines
+
+    def write_json(self, path):
+        """Записывает отчет в JSON файл"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def get_peak_memory_kb():
+    """Возвращает пиковый размер резидентной памяти процесса в КБ или None, если он недоступен"""
+    if resource is None:
+        return None
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    if sys.platform == 'darwin':
+        return peak_memory // 1024
+    return peak_memory
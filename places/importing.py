@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+from urllib.parse import urlparse
+
+from django.core.files import File
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .blobs import IMAGE_BLOBS_DIR, save_image_blob
+from .models import PlaceImage
+
+
+REQUEST_TIMEOUT = 30
+
+RETRY_BACKOFF_FACTOR = 0.5
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+MAX_IMAGE_SIZE = 20 * 1024 * 1024
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+ALLOWED_CONTENT_TYPE_PREFIXES = ('image/', 'application/octet-stream')
+
+KNOWN_URLS_QUERY_CHUNK_SIZE = 500
+
+REQUIRED_FIELDS = ['title', 'description_short', 'description_long', 'coordinates']
+
+# SQLite допускает только одного пишущего, поэтому параллельные загрузки
+# скачивают данные одновременно, а в базу пишут по очереди.
+db_write_lock = threading.Lock()
+
+
+def create_session(pool_size, retries):
+    """Создает HTTP-сессию с пулом keep-alive соединений и повторами с нарастающей паузой"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=['GET']
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def validate_raw_place(raw_place):
+    """Проверяет, что в данных о месте есть все обязательные поля"""
+    for field in REQUIRED_FIELDS:
+        if field not in raw_place:
+            raise ValueError(f'Отсутствует обязательное поле: {field}')
+
+    coordinates = raw_place['coordinates']
+    if 'lat' not in coordinates or 'lng' not in coordinates:
+        raise ValueError('Отсутствуют координаты (lat, lng)')
+
+
+def download_image(session, image_url, max_size=MAX_IMAGE_SIZE):
+    """Скачивает изображение по частям во временный файл и возвращает его, перемотанный в начало, и SHA-256; файл закрывает вызывающий код"""
+    try:
+        with session.get(image_url, timeout=REQUEST_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            _check_image_headers(response, max_size)
+
+            image_file = tempfile.TemporaryFile()
+            try:
+                content_hash = hashlib.sha256()
+                size = 0
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_size:
+                        raise Exception(f'Изображение больше {max_size} байт')
+                    content_hash.update(chunk)
+                    image_file.write(chunk)
+                image_file.seek(0)
+            except BaseException:
+                image_file.close()
+                raise
+
+            return image_file, content_hash.hexdigest()
+    except requests.RequestException as e:
+        raise Exception(f'Ошибка скачивания изображения: {e}')
+
+
+def _check_image_headers(response, max_size):
+    content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    if content_type and not content_type.startswith(ALLOWED_CONTENT_TYPE_PREFIXES):
+        raise Exception(f'Неподдерживаемый тип содержимого: {content_type}')
+
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit() and int(content_length) > max_size:
+        raise Exception(f'Изображение больше {max_size} байт')
+
+
+def fetch_image_blobs(session, image_urls, workers, max_size=MAX_IMAGE_SIZE, known_blobs=None, stats=None):
+    """Возвращает словарь {URL: (имя файла в хранилище, SHA-256) или исключение}, скачивая каждый URL не больше раза"""
+    # Изображения, уже сохранённые для других мест или переданные в known_blobs, берутся готовыми
+    image_urls = list(dict.fromkeys(image_urls))
+    blobs = {url: known_blobs[url] for url in image_urls if known_blobs and url in known_blobs}
+    blobs.update(get_stored_image_blobs([url for url in image_urls if url not in blobs]))
+
+    def fetch(image_url):
+        try:
+            started = perf_counter()
+            image_file, content_hash = download_image(session, image_url, max_size)
+            with image_file:
+                if stats is not None:
+                    stats.add_download(os.fstat(image_file.fileno()).st_size, perf_counter() - started)
+                with stats.measure('storage') if stats is not None else nullcontext():
+                    return save_image_blob(File(image_file), get_image_filename(image_url, 0), content_hash)
+        except Exception as e:
+            return e
+
+    missing_urls = [url for url in image_urls if url not in blobs]
+    if missing_urls:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            blobs.update(zip(missing_urls, executor.map(fetch, missing_urls)))
+
+    if known_blobs is not None:
+        known_blobs.update(
+            (url, blob) for url, blob in blobs.items() if not isinstance(blob, Exception)
+        )
+    return blobs
+
+
+def get_stored_image_blobs(image_urls):
+    """Находит изображения, уже скачанные с этих URL и сохранённые по адресу из SHA-256"""
+    blobs = {}
+    for start in range(0, len(image_urls), KNOWN_URLS_QUERY_CHUNK_SIZE):
+        chunk = image_urls[start:start + KNOWN_URLS_QUERY_CHUNK_SIZE]
+        stored_images = PlaceImage.objects.filter(
+            source_url__in=chunk,
+            image__startswith=f'{IMAGE_BLOBS_DIR}/'
+        ).exclude(content_hash='').values_list('source_url', 'image', 'content_hash')
+        for source_url, name, content_hash in stored_images:
+            blobs[source_url] = (name, content_hash)
+    return blobs
+
+
+def get_image_filename(image_url, order):
+    """Возвращает имя файла изображения по его URL"""
+    filename = os.path.basename(urlparse(image_url).path)
+    return filename or f'image_{order}.jpg'
+
+
+def get_raw_place_hash(raw_place):
+    """Возвращает SHA-256 данных о месте, не зависящий от порядка ключей в JSON"""
+    serialized = json.dumps(raw_place, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def get_file_hash(field_file):
+    """Возвращает SHA-256 файла из хранилища, читая его по частям"""
+    content_hash = hashlib.sha256()
+    with field_file.open('rb') as f:
+        for chunk in f.chunks():
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
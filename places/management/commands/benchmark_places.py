@@ -0,0 +1,247 @@
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from places.cache import bump_data_version, clear_process_payloads, invalidate_place_details
+from places.models import Place
+from places.synthetic import PLACES_DIR, serve_directory, write_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время, количество SQL-запросов и пиковую память импорта мест, '
+        'страницы карты, JSON с деталями места и списка мест в админке на синтетических данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--places',
+            type=int,
+            default=100,
+            help='Количество мест в синтетическом наборе'
+        )
+
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=2,
+            help='Количество изображений у каждого места'
+        )
+
+        parser.add_argument(
+            '--image-size',
+            type=str,
+            default='800x533',
+            help='Размер синтетических изображений в виде ШИРИНАxВЫСОТА'
+        )
+
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=20,
+            help='Количество запросов к каждому представлению'
+        )
+
+        parser.add_argument(
+            '--json-report',
+            type=str,
+            help='Путь к файлу, в который будут записаны результаты в формате JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['places'] < 2 or options['images'] < 0 or options['runs'] < 1:
+            raise CommandError('--places должен быть не меньше 2, --images неотрицательным, а --runs положительным')
+
+        try:
+            image_size = tuple(int(side) for side in options['image_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--image-size должен иметь вид ШИРИНАxВЫСОТА, например 800x533')
+
+        self.results = []
+        with tempfile.TemporaryDirectory() as directory, self._isolated_environment(directory):
+            dataset_dir = os.path.join(directory, 'dataset')
+            os.makedirs(dataset_dir)
+            with serve_directory(dataset_dir) as base_url:
+                self.stdout.write('Генерация синтетического набора мест...')
+                json_paths = write_dataset(
+                    dataset_dir, options['places'], options['images'], base_url, image_size=image_size
+                )
+                self._benchmark_import(json_paths, os.path.join(dataset_dir, PLACES_DIR))
+
+            self._benchmark_views(options['runs'])
+
+        self._report()
+        if options['json_report']:
+            with open(options['json_report'], 'w', encoding='utf-8') as f:
+                json.dump(self.results, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Отчет записан в {options["json_report"]}')
+
+    @contextlib.contextmanager
+    def _isolated_environment(self, directory):
+        """Переключает базу, медиафайлы, кэш и тайлы на временную папку, чтобы не трогать рабочие данные"""
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(directory, 'media'),
+                PLACES_TILES_ROOT=os.path.join(directory, 'tiles'),
+                CACHES={
+                    'default': {
+                        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': 'benchmark',
+                    },
+                    'places_state': {
+                        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                        'LOCATION': os.path.join(directory, 'cache', 'state'),
+                        'TIMEOUT': None,
+                    },
+                },
+                ALLOWED_HOSTS=['testserver'],
+            ):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+    def _benchmark_import(self, json_paths, places_dir):
+        self._measure(
+            'load_place',
+            lambda: self._call_quietly('load_place', json_paths[0]),
+            setup=self._delete_places
+        )
+        self._measure(
+            'load_all_places',
+            lambda: self._call_quietly('load_all_places', places_dir),
+            setup=self._delete_places
+        )
+        self._measure(
+            'load_all_places --batch',
+            lambda: self._call_quietly('load_all_places', places_dir, '--batch'),
+            setup=self._delete_places
+        )
+
+    def _benchmark_views(self, runs):
+        client = Client()
+        place_id = Place.objects.order_by('id').values_list('id', flat=True).first()
+        map_url = reverse('main')
+        details_url = reverse('place_details', kwargs={'place_id': place_id})
+
+        self._measure('get_places_map (кэш)', lambda: self._get(client, map_url), runs)
+        self._measure(
+            'get_places_map (без кэша)',
+            lambda: self._get(client, map_url),
+            runs,
+            setup=clear_process_payloads
+        )
+        self._measure('get_place_details_json (кэш)', lambda: self._get(client, details_url), runs)
+        self._measure(
+            'get_place_details_json (без кэша)',
+            lambda: self._get(client, details_url),
+            runs,
+            setup=lambda: invalidate_place_details(place_id)
+        )
+
+        # GeoJSON собирается из снимка мест в памяти процесса: замер без кэша идет
+        # сразу после изменения данных, когда снимок и закэшированный ответ устарели
+        geojson_url = reverse('places_geojson')
+        for name, params in (
+            ('get_places_geojson', {}),
+            ('get_places_geojson bbox', {'bbox': '37.5,55.7,37.7,55.8'}),
+        ):
+            self._measure(f'{name} (кэш)', lambda: self._get(client, geojson_url, params), runs)
+            self._measure(
+                f'{name} (без кэша)',
+                lambda: self._get(client, geojson_url, params),
+                runs,
+                setup=bump_data_version
+            )
+
+        # Кластеры, поиск и места рядом читают базу на каждый запрос
+        for name, url, params in (
+            ('get_place_clusters', reverse('place_clusters'), {'bbox': '37.3,55.5,37.9,56', 'zoom': '10'}),
+            ('search_places_json', reverse('places_search'), {'q': 'парк'}),
+            ('get_nearby_places_json', reverse('places_nearby'), {'lat': '55.75', 'lng': '37.6', 'radius': '5000'}),
+        ):
+            self._measure(name, lambda: self._get(client, url, params), runs)
+
+        admin_client = Client()
+        admin_client.force_login(
+            get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        )
+        changelist_url = reverse('admin:places_place_changelist')
+        self._measure('PlaceAdmin changelist', lambda: self._get(admin_client, changelist_url), runs)
+
+    def _get(self, client, url, params=None):
+        response = client.get(url, params)
+        if response.status_code != 200:
+            raise CommandError(f'{url} вернул статус {response.status_code}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def _call_quietly(self, *args):
+        # load_all_places вызывает load_place со своим выводом, поэтому перехватывается весь stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            call_command(*args)
+
+    def _delete_places(self):
+        Place.objects.all().delete()
+
+    def _measure(self, name, action, runs=1, setup=None):
+        """Выполняет действие runs раз, замеряя время и SQL-запросы, и еще раз под tracemalloc для пиковой памяти"""
+        self.stdout.write(f'Замер: {name}')
+        # Без setup первый прогон прогревает кэши
+        if setup is None:
+            action()
+
+        latencies = []
+        queries_counts = []
+        for _ in range(runs):
+            if setup:
+                setup()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                action()
+                latencies.append(time.perf_counter() - started)
+            queries_counts.append(len(queries))
+
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            action()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        latencies.sort()
+        self.results.append({
+            'name': name,
+            'runs': runs,
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+            'queries': max(queries_counts),
+            'peak_memory_kb': round(peak_memory / 1024),
+        })
+
+    def _report(self):
+        header = f'{"Сценарий":<36} {"Прогонов":>8} {"p50, мс":>10} {"p95, мс":>10} {"Макс., мс":>10} {"SQL":>6} {"Память, КБ":>11}'
+        self.stdout.write('\n' + header)
+        self.stdout.write('-' * len(header))
+        for result in self.results:
+            self.stdout.write(
+                f'{result["name"]:<36} {result["runs"]:>8} {result["p50_ms"]:>10.2f} {result["p95_ms"]:>10.2f} '
+                f'{result["max_ms"]:>10.2f} {result["queries"]:>6} {result["peak_memory_kb"]:>11}'
+            )
@@ -0,0 +1,181 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+BBOX_QUERY = (
+    'SELECT id, title, latitude, longitude FROM bench_places '
+    'WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?'
+)
+
+INSERT_QUERY = 'INSERT INTO bench_places (title, latitude, longitude) VALUES (?, ?, ?)'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает конкурентное чтение и запись в SQLite с настройками по умолчанию '
+        'и с профилем из SQLITE_PRAGMAS на временной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--readers',
+            type=int,
+            default=4,
+            help='Количество потоков, читающих места по области карты'
+        )
+
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5.0,
+            help='Длительность замера для каждого профиля в секундах'
+        )
+
+        parser.add_argument(
+            '--places',
+            type=int,
+            default=20000,
+            help='Количество мест в тестовой базе'
+        )
+
+        parser.add_argument(
+            '--write-batch',
+            type=int,
+            default=500,
+            help='Количество мест, вставляемых писателем в одной транзакции'
+        )
+
+        parser.add_argument(
+            '--write-hold',
+            type=float,
+            default=0.05,
+            help='Сколько секунд писатель держит открытой каждую транзакцию, имитируя импорт'
+        )
+
+    def handle(self, *args, **options):
+        if options['readers'] < 1 or options['places'] < 1 or options['write_batch'] < 1:
+            raise CommandError('--readers, --places и --write-batch должны быть положительными числами')
+        if options['duration'] <= 0 or options['write_hold'] < 0:
+            raise CommandError('--duration должен быть положительным, а --write-hold неотрицательным')
+
+        profiles = {
+            'default': {'pragmas': [], 'persistent': False, 'begin': 'BEGIN', 'timeout': 5.0},
+            'tuned': {
+                'pragmas': [f'PRAGMA {name}={value}' for name, value in settings.SQLITE_PRAGMAS.items()],
+                'persistent': True,
+                'begin': 'BEGIN IMMEDIATE',
+                'timeout': settings.SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            },
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name, profile in profiles.items():
+                path = os.path.join(directory, f'{name}.sqlite3')
+                self._create_database(path, options['places'])
+                stats = self._run_profile(path, profile, options)
+                self._report(name, stats, options['duration'])
+
+    def _create_database(self, path, places_count):
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE bench_places ('
+            'id INTEGER PRIMARY KEY, title TEXT NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX bench_places_coordinates ON bench_places (latitude, longitude)')
+        randomizer = random.Random(0)
+        connection.executemany(INSERT_QUERY, (
+            (f'Место {number}', randomizer.uniform(-60, 70), randomizer.uniform(-180, 180))
+            for number in range(places_count)
+        ))
+        connection.commit()
+        connection.close()
+
+    def _connect(self, path, profile):
+        connection = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+        for pragma in profile['pragmas']:
+            connection.execute(pragma)
+        return connection
+
+    def _run_profile(self, path, profile, options):
+        stop = threading.Event()
+        stats = {'latencies': [], 'read_errors': 0, 'writes': 0, 'write_errors': 0}
+        stats_lock = threading.Lock()
+
+        def read():
+            randomizer = random.Random()
+            connection = self._connect(path, profile) if profile['persistent'] else None
+            latencies = []
+            errors = 0
+            while not stop.is_set():
+                latitude = randomizer.uniform(-60, 60)
+                longitude = randomizer.uniform(-170, 170)
+                started = time.perf_counter()
+                try:
+                    reader = connection or self._connect(path, profile)
+                    reader.execute(BBOX_QUERY, (latitude, latitude + 5, longitude, longitude + 10)).fetchall()
+                    if connection is None:
+                        reader.close()
+                except sqlite3.OperationalError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+            if connection:
+                connection.close()
+            with stats_lock:
+                stats['latencies'].extend(latencies)
+                stats['read_errors'] += errors
+
+        def write():
+            randomizer = random.Random()
+            connection = self._connect(path, profile)
+            while not stop.is_set():
+                try:
+                    connection.execute(profile['begin'])
+                    connection.executemany(INSERT_QUERY, (
+                        ('Новое место', randomizer.uniform(-60, 70), randomizer.uniform(-180, 180))
+                        for _ in range(options['write_batch'])
+                    ))
+                    time.sleep(options['write_hold'])
+                    connection.execute('COMMIT')
+                    stats['writes'] += options['write_batch']
+                except sqlite3.OperationalError:
+                    if connection.in_transaction:
+                        connection.execute('ROLLBACK')
+                    stats['write_errors'] += 1
+            connection.close()
+
+        threads = [threading.Thread(target=read) for _ in range(options['readers'])]
+        threads.append(threading.Thread(target=write))
+        for thread in threads:
+            thread.start()
+        time.sleep(options['duration'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def _report(self, name, stats, duration):
+        latencies = sorted(stats['latencies'])
+        self.stdout.write(self.style.SUCCESS(f'Профиль {name}:'))
+        if latencies:
+            self.stdout.write(
+                f'  Чтения: {len(latencies) / duration:.0f} в секунду, '
+                f'p50 {statistics.median(latencies) * 1000:.2f} мс, '
+                f'p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} мс, '
+                f'макс. {latencies[-1] * 1000:.2f} мс'
+            )
+        else:
+            self.stdout.write('  Чтения: ни одно чтение не завершилось')
+        self.stdout.write(
+            f'  Ошибок чтения: {stats["read_errors"]}, '
+            f'записано мест: {stats["writes"]} ({stats["writes"] / duration:.0f} в секунду), '
+            f'ошибок записи: {stats["write_errors"]}'
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from places.tiles import clear_tiles, get_tiles_root
+
+
+class Command(BaseCommand):
+    help = 'Удаляет все тайлы карты из кэша на диске'
+
+    def handle(self, *args, **options):
+        clear_tiles()
+        self.stdout.write(
+            self.style.SUCCESS(f'Кэш тайлов очищен: {get_tiles_root()}')
+        )
@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli, compress_content
+from places.models import Place
+from places.registry import get_places_snapshot
+from places.serializers import dump_place_details
+
+
+MANIFEST_FILENAME = 'manifest.json'
+
+GEOJSON_PATH = 'places.geojson'
+
+
+class Command(BaseCommand):
+    help = 'Выгружает GeoJSON карты и JSON с деталями всех мест в статические файлы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_dir',
+            type=str,
+            help='Папка, в которую будут записаны файлы'
+        )
+
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='Дополнительно записать сжатые копии файлов (.gz, а также .br, если установлен brotli)'
+        )
+
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Перезаписать все файлы, даже если их содержимое не изменилось'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество мест, загружаемых из базы за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir']
+        self.compress = options['compress']
+        force = options['force']
+        self.verbosity = options['verbosity']
+        batch_size = options['batch_size']
+
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть положительным числом')
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        previous_manifest = {} if force else self._read_manifest(output_dir)
+        manifest = {}
+        written_count = 0
+
+        # Файлы сериализуются напрямую, а не через кэш ответов: разовая выгрузка
+        # всего каталога вытеснила бы из него детали, которые часто запрашивают
+        geojson = get_places_snapshot().dump_geojson()
+        if self._export_file(output_dir, GEOJSON_PATH, geojson, previous_manifest, manifest):
+            written_count += 1
+
+        places = Place.objects.order_by('id').prefetch_related('images')
+        for place in places.iterator(chunk_size=batch_size):
+            path = os.path.join('places', f'{place.id}.json')
+            if self._export_file(output_dir, path, dump_place_details(place), previous_manifest, manifest):
+                written_count += 1
+
+        removed_count = 0
+        for stale_path in previous_manifest.keys() - manifest.keys():
+            self._remove_file(output_dir, stale_path)
+            removed_count += 1
+
+        self._write_manifest(output_dir, manifest)
+
+        self.stdout.write(f'Мест выгружено: {len(manifest) - 1}')
+        self.stdout.write(f'Файлов записано: {written_count}')
+        self.stdout.write(f'Файлов удалено: {removed_count}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Выгрузка завершена: {output_dir}')
+        )
+
+    def _export_file(self, output_dir, path, content, previous_manifest, manifest):
+        """Записывает файл, если его содержимое изменилось с прошлой выгрузки"""
+        content_hash = hashlib.sha256(content).hexdigest()
+        manifest[path] = content_hash
+
+        full_path = os.path.join(output_dir, path)
+        is_unchanged = (
+            previous_manifest.get(path) == content_hash
+            and os.path.exists(full_path)
+            and (not self.compress or os.path.exists(f'{full_path}.gz'))
+        )
+        if is_unchanged:
+            return False
+
+        self._write_file(full_path, content)
+        if self.compress:
+            # compress_content не сжимает маленькие файлы, их сжимаем отдельно
+            encodings = compress_content(content)
+            self._write_file(
+                f'{full_path}.gz',
+                encodings.get('gzip') or gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+            )
+            if brotli:
+                self._write_file(
+                    f'{full_path}.br',
+                    encodings.get('br') or brotli.compress(content, quality=BROTLI_QUALITY)
+                )
+
+        if self.verbosity > 1:
+            self.stdout.write(f'  Записан файл: {path}')
+        return True
+
+    def _write_file(self, full_path, content):
+        """Атомарно записывает файл, чтобы веб-сервер не отдал его частично записанным"""
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as tmp_file:
+            tmp_file.write(content)
+        os.chmod(tmp_file.name, 0o644)
+        os.replace(tmp_file.name, full_path)
+
+    def _remove_file(self, output_dir, path):
+        """Удаляет файл удалённого места вместе со сжатыми копиями"""
+        full_path = os.path.join(output_dir, path)
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(f'{full_path}{suffix}')
+            except FileNotFoundError:
+                pass
+
+    def _read_manifest(self, output_dir):
+        """Читает хэши файлов, записанных прошлой выгрузкой"""
+        try:
+            with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self, output_dir, manifest):
+        """Сохраняет хэши записанных файлов для следующей выгрузки"""
+        content = json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8')
+        self._write_file(os.path.join(output_dir, MANIFEST_FILENAME), content)
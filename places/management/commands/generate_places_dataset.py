@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from places.synthetic import PLACES_DIR, serve_directory, write_dataset
+
+
+class Command(BaseCommand):
+    help = 'Создает синтетический набор мест с изображениями для замеров производительности'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_dir',
+            type=str,
+            help='Папка, в которую будут записаны JSON файлы и изображения'
+        )
+
+        parser.add_argument(
+            '--places',
+            type=int,
+            default=100,
+            help='Количество мест'
+        )
+
+        parser.add_argument(
+            '--images',
+            type=int,
+            default=3,
+            help='Количество изображений у каждого места'
+        )
+
+        parser.add_argument(
+            '--image-size',
+            type=str,
+            default='1600x1067',
+            help='Размер изображений в виде ШИРИНАxВЫСОТА'
+        )
+
+        parser.add_argument(
+            '--base-url',
+            type=str,
+            default='http://127.0.0.1:8765',
+            help='Адрес, с которого будут раздаваться изображения'
+        )
+
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора случайных чисел; одинаковое зерно дает одинаковый набор'
+        )
+
+        parser.add_argument(
+            '--serve',
+            action='store_true',
+            help='После генерации раздавать папку по адресу --base-url до нажатия Ctrl+C'
+        )
+
+    def handle(self, *args, **options):
+        if options['places'] < 1 or options['images'] < 0:
+            raise CommandError('--places должен быть положительным, а --images неотрицательным')
+
+        try:
+            width, height = (int(side) for side in options['image_size'].lower().split('x'))
+        except ValueError:
+            raise CommandError('--image-size должен иметь вид ШИРИНАxВЫСОТА, например 1600x1067')
+
+        output_dir = options['output_dir']
+        json_paths = write_dataset(
+            output_dir,
+            options['places'],
+            options['images'],
+            options['base_url'],
+            image_size=(width, height),
+            seed=options['seed']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано мест: {len(json_paths)}, изображений: {len(json_paths) * options["images"]}. '
+            f'JSON файлы: {os.path.join(output_dir, PLACES_DIR)}'
+        ))
+
+        if options['serve']:
+            host, _, port = options['base_url'].split('://', 1)[-1].rstrip('/').partition(':')
+            with serve_directory(output_dir, host, int(port or 80)) as base_url:
+                self.stdout.write(f'Изображения раздаются по адресу {base_url}, Ctrl+C для остановки')
+                try:
+                    while True:
+                        time.sleep(60)
+                except KeyboardInterrupt:
+                    pass
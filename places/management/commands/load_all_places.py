@@ -1,8 +1,33 @@
 import glob
+import io
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from places.cache import invalidate_places_details
+from places.geo import get_nearby_cell
+from places.importing import (
+    MAX_IMAGE_SIZE,
+    create_session,
+    db_write_lock,
+    fetch_image_blobs,
+    get_raw_place_hash,
+    validate_raw_place,
+)
+from places.import_stats import ImportStats
+from places.models import Place, PlaceImage
+from places.signals import places_bulk_created
+from places.processing import process_image_ids, process_images
+
+
+TITLES_QUERY_CHUNK_SIZE = 500
+
+BATCH_IMAGES_CHUNK_SIZE = 50
 
 
 class Command(BaseCommand):
@@ -14,65 +39,383 @@ class Command(BaseCommand):
             type=str,
             help='Путь к папке с JSON файлами'
         )
-        
+
         parser.add_argument(
             '--force',
             action='store_true',
             help='Перезаписать данные мест, если они уже существуют'
         )
 
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Количество файлов, загружаемых одновременно'
+        )
+
+        parser.add_argument(
+            '--image-workers',
+            type=int,
+            default=4,
+            help='Количество изображений одного места, скачиваемых одновременно'
+        )
+
+        parser.add_argument(
+            '--max-image-size',
+            type=int,
+            default=MAX_IMAGE_SIZE,
+            help='Максимальный размер изображения в байтах; изображения больше пропускаются'
+        )
+
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            help='Создать новые места пакетно: одним запросом проверить существующие и вставить новые'
+        )
+
+        parser.add_argument(
+            '--report-json',
+            type=str,
+            help='Путь к файлу, в который будет записан отчет о времени этапов загрузки в формате JSON'
+        )
+
     def handle(self, *args, **options):
         folder_path = options['folder_path']
         force = options['force']
-        
+        workers = options['workers']
+        self.image_workers = options['image_workers']
+        self.max_image_size = options['max_image_size']
+        self.verbosity = options['verbosity']
+
+        if workers < 1 or self.image_workers < 1 or self.max_image_size < 1:
+            self.stderr.write(
+                self.style.ERROR('--workers, --image-workers и --max-image-size должны быть положительными числами')
+            )
+            return
+
         if not os.path.exists(folder_path):
             self.stderr.write(
                 self.style.ERROR(f'Папка не найдена: {folder_path}')
             )
             return
-        
+
         json_pattern = os.path.join(folder_path, '*.json')
         json_files = glob.glob(json_pattern)
-        
+
         if not json_files:
             self.stderr.write(
                 self.style.ERROR(f'JSON файлы не найдены в папке: {folder_path}')
             )
             return
-        
+
         total_files = len(json_files)
         self.stdout.write(f'Найдено {total_files} JSON файлов для загрузки')
-        
-        success_count = 0
-        error_count = 0
-        
-        for i, json_file in enumerate(json_files, 1):
-            filename = os.path.basename(json_file)
-            self.stdout.write(f'\n[{i}/{total_files}] Загрузка файла: {filename}')
-            
-            try:
-                call_command('load_place', json_file, force=force, verbosity=0)
-                success_count += 1
-                self.stdout.write(
-                    self.style.SUCCESS(f'✓ Успешно загружено: {filename}')
-                )
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(
-                    self.style.ERROR(f'✗ Ошибка загрузки {filename}: {e}')
-                )
-        
+
+        self.success_count = 0
+        self.error_count = 0
+        self.import_stats = ImportStats()
+        self.pending_image_ids = set()
+
+        if options['batch']:
+            self._load_batch(json_files, force, workers)
+        elif workers > 1:
+            self._load_parallel(json_files, force, workers)
+        else:
+            self._load_serial(json_files, force)
+
+        self._process_pending_images()
+
         self.stdout.write(f'\n' + '='*50)
         self.stdout.write(f'Загрузка завершена!')
-        self.stdout.write(f'Успешно загружено: {success_count}')
-        self.stdout.write(f'Ошибок: {error_count}')
+        self.stdout.write(f'Успешно загружено: {self.success_count}')
+        self.stdout.write(f'Ошибок: {self.error_count}')
         self.stdout.write(f'Всего файлов: {total_files}')
-        
-        if error_count == 0:
+
+        self.import_stats.finish()
+        self.stdout.write('')
+        for line in self.import_stats.format_summary():
+            self.stdout.write(line)
+        if options['report_json']:
+            self.import_stats.write_json(options['report_json'])
+            self.stdout.write(f'Отчет записан в {options["report_json"]}')
+
+        if self.error_count == 0:
             self.stdout.write(
                 self.style.SUCCESS('Все файлы успешно загружены!')
             )
         else:
             self.stdout.write(
-                self.style.WARNING(f'Загрузка завершена с {error_count} ошибками.')
-            ) 
\ No newline at end of file
+                self.style.WARNING(f'Загрузка завершена с {self.error_count} ошибками.')
+            )
+
+    def _load_serial(self, json_files, force):
+        """Загружает файлы по одному через команду load_place"""
+        for i, json_file in enumerate(json_files, 1):
+            filename = os.path.basename(json_file)
+            self.stdout.write(f'\n[{i}/{len(json_files)}] Загрузка файла: {filename}')
+
+            try:
+                call_command(
+                    'load_place',
+                    json_file,
+                    force=force,
+                    image_workers=self.image_workers,
+                    max_image_size=self.max_image_size,
+                    import_stats=self.import_stats,
+                    pending_image_ids=self.pending_image_ids,
+                    verbosity=0
+                )
+                self._report_success(filename)
+            except Exception as e:
+                self._report_error(filename, e)
+
+    def _load_parallel(self, json_files, force, workers):
+        """Загружает несколько файлов одновременно через команду load_place"""
+        self.stdout.write(f'Загрузка в {workers} потоков')
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._load_file, json_file, force): json_file
+                for json_file in json_files
+            }
+
+            for future in as_completed(futures):
+                filename = os.path.basename(futures[future])
+                output, error = future.result()
+
+                if self.verbosity > 1:
+                    self.stdout.write(output, ending='')
+
+                if error:
+                    self._report_error(filename, error)
+                else:
+                    self._report_success(filename)
+
+    def _load_file(self, json_file, force):
+        """Загружает один файл в отдельном потоке и возвращает вывод команды и ошибку"""
+        output = io.StringIO()
+        try:
+            call_command(
+                'load_place',
+                json_file,
+                force=force,
+                image_workers=self.image_workers,
+                max_image_size=self.max_image_size,
+                import_stats=self.import_stats,
+                pending_image_ids=self.pending_image_ids,
+                verbosity=0,
+                stdout=output
+            )
+            return output.getvalue(), None
+        except Exception as e:
+            return output.getvalue(), e
+        finally:
+            connections.close_all()
+
+    def _process_pending_images(self):
+        """Обрабатывает изображения всех мест, загруженных через load_place, одним проходом после записи в базу"""
+        if not self.pending_image_ids:
+            return
+
+        self.stdout.write(f'\nОбработка изображений: {len(self.pending_image_ids)}')
+        processing_stats = self.import_stats.add_batch('Обработка изображений')
+        try:
+            with processing_stats.measure('processing'):
+                _, errors = process_image_ids(self.pending_image_ids)
+        finally:
+            processing_stats.finish()
+
+        for image, error in errors:
+            self.stdout.write(
+                self.style.ERROR(f'  Ошибка обработки {image.image.name}: {error}')
+            )
+
+    def _load_batch(self, json_files, force, workers):
+        """Создает новые места пакетно, а существующие обновляет через load_place"""
+        raw_places = {}
+        for json_file in json_files:
+            filename = os.path.basename(json_file)
+            file_stats = self.import_stats.add_file(json_file)
+            try:
+                with file_stats.measure('fetch'):
+                    with open(json_file, 'r', encoding='utf-8') as f:
+                        raw_place = json.load(f)
+                validate_raw_place(raw_place)
+                raw_places[json_file] = raw_place
+            except Exception as e:
+                self._report_error(filename, e)
+            finally:
+                file_stats.finish()
+
+        titles = [raw_place['title'] for raw_place in raw_places.values()]
+        existing_titles = self._get_existing_titles(titles)
+
+        new_places = {}
+        existing_files = []
+        for json_file, raw_place in raw_places.items():
+            title = raw_place['title']
+            if title in existing_titles or title in new_places:
+                existing_files.append(json_file)
+            else:
+                new_places[title] = (json_file, raw_place)
+
+        self.stdout.write(f'Новых мест: {len(new_places)}, уже существующих: {len(existing_files)}')
+
+        if new_places:
+            self._create_places_batch(list(new_places.values()))
+
+        if not existing_files:
+            return
+
+        if not force:
+            for json_file in existing_files:
+                filename = os.path.basename(json_file)
+                self.stdout.write(
+                    self.style.WARNING(f'Место из {filename} уже существует. Используйте --force для перезаписи.')
+                )
+                self._report_success(filename)
+            return
+
+        if workers > 1:
+            self._load_parallel(existing_files, force, workers)
+        else:
+            self._load_serial(existing_files, force)
+
+    def _get_existing_titles(self, titles):
+        """Находит уже загруженные места по названиям"""
+        existing_titles = set()
+        for start in range(0, len(titles), TITLES_QUERY_CHUNK_SIZE):
+            chunk = titles[start:start + TITLES_QUERY_CHUNK_SIZE]
+            existing_titles.update(
+                Place.objects.filter(title__in=chunk).values_list('title', flat=True)
+            )
+        return existing_titles
+
+    def _create_places_batch(self, new_places):
+        """Создает места одним bulk_create, затем пакетами скачивает и сохраняет их изображения"""
+        self.batch_stats = self.import_stats.add_batch(f'Пакетное создание мест ({len(new_places)})')
+        try:
+            with self.batch_stats.measure_queries():
+                failed_images = self._create_places_and_images(new_places)
+        finally:
+            self.batch_stats.finish()
+
+        for json_file, _ in new_places:
+            filename = os.path.basename(json_file)
+            if json_file in failed_images:
+                self._report_error(filename, f'не удалось загрузить изображений: {failed_images[json_file]}')
+            else:
+                self._report_success(filename)
+
+    def _create_places_and_images(self, new_places):
+        """Вставляет места, сохраняет их изображения пачками и возвращает {JSON файл: число незагруженных изображений}"""
+        # Производные данные обновляются сразу после вставки мест, даже если загрузка изображений прервется
+        with db_write_lock, transaction.atomic():
+            places = Place.objects.bulk_create(
+                [
+                    Place(
+                        title=raw_place['title'],
+                        short_description=raw_place['description_short'],
+                        long_description=raw_place['description_long'],
+                        latitude=raw_place['coordinates']['lat'],
+                        longitude=raw_place['coordinates']['lng'],
+                        nearby_cell=get_nearby_cell(
+                            raw_place['coordinates']['lat'],
+                            raw_place['coordinates']['lng']
+                        )
+                    )
+                    for _, raw_place in new_places
+                ],
+                batch_size=500
+            )
+            places_bulk_created.send(sender=Place, places=places)
+
+        places_with_sources = list(zip(places, new_places))
+        self.image_blobs = {}
+        failed_counts = {}
+
+        session = create_session(self.image_workers, retries=3)
+        try:
+            for start in range(0, len(places_with_sources), BATCH_IMAGES_CHUNK_SIZE):
+                chunk = places_with_sources[start:start + BATCH_IMAGES_CHUNK_SIZE]
+                failed_counts.update(self._create_images_batch(session, chunk))
+        finally:
+            session.close()
+
+        # Без хэша исходных данных повторный запуск с --force догрузит недостающие изображения
+        complete_places = []
+        for place, (_, raw_place) in places_with_sources:
+            if place.id not in failed_counts:
+                place.source_hash = get_raw_place_hash(raw_place)
+                complete_places.append(place)
+        with db_write_lock, transaction.atomic():
+            Place.objects.bulk_update(complete_places, ['source_hash'], batch_size=500)
+
+        return {
+            json_file: failed_counts[place.id]
+            for place, (json_file, _) in places_with_sources
+            if place.id in failed_counts
+        }
+
+    def _create_images_batch(self, session, places_with_sources):
+        """Скачивает и создает изображения пачки мест и возвращает {ID места: число изображений, которые не удалось скачать}"""
+        image_sources = [
+            (place, order, image_url)
+            for place, (_, raw_place) in places_with_sources
+            for order, image_url in enumerate(raw_place.get('imgs', []))
+        ]
+
+        image_blobs = fetch_image_blobs(
+            session,
+            [image_url for _, _, image_url in image_sources],
+            self.image_workers,
+            self.max_image_size,
+            known_blobs=self.image_blobs,
+            stats=self.batch_stats
+        )
+
+        images = []
+        failed_counts = {}
+        for place, order, image_url in image_sources:
+            image_blob = image_blobs[image_url]
+            if isinstance(image_blob, Exception):
+                self.stdout.write(
+                    self.style.ERROR(f'  Ошибка загрузки изображения {image_url}: {image_blob}')
+                )
+                failed_counts[place.id] = failed_counts.get(place.id, 0) + 1
+                continue
+
+            image_name, content_hash = image_blob
+            images.append(
+                PlaceImage(
+                    place=place,
+                    order=order,
+                    source_url=image_url,
+                    content_hash=content_hash,
+                    image=image_name
+                )
+            )
+
+        with db_write_lock, transaction.atomic():
+            PlaceImage.objects.bulk_create(images, batch_size=500)
+            # bulk_create не вызывает сигналы, а детали мест могли попасть в кэш еще без изображений
+            transaction.on_commit(partial(
+                invalidate_places_details, [place.id for place, _ in places_with_sources]
+            ))
+
+        with self.batch_stats.measure('processing'):
+            process_images(images)
+
+        return failed_counts
+
+    def _report_success(self, filename):
+        self.success_count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Успешно загружено: {filename}')
+        )
+
+    def _report_error(self, filename, error):
+        self.error_count += 1
+        self.stdout.write(
+            self.style.ERROR(f'✗ Ошибка загрузки {filename}: {error}')
+        )
@@ -1,14 +1,25 @@
+import argparse
 import json
 import os
-from urllib.parse import urlparse
 
-from django.core.files.base import ContentFile
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
 import requests
 
+from places.importing import (
+    MAX_IMAGE_SIZE,
+    REQUEST_TIMEOUT,
+    create_session,
+    db_write_lock,
+    fetch_image_blobs,
+    get_file_hash,
+    get_raw_place_hash,
+    validate_raw_place,
+)
+from places.import_stats import ImportStats
 from places.models import Place, PlaceImage
+from places.processing import collect_image_processing, process_image_ids
 
 
 class Command(BaseCommand):
@@ -27,27 +38,99 @@ class Command(BaseCommand):
             help='Перезаписать данные места, если оно уже существует'
         )
 
+        parser.add_argument(
+            '--image-workers',
+            type=int,
+            default=4,
+            help='Количество изображений, скачиваемых одновременно'
+        )
+
+        parser.add_argument(
+            '--retries',
+            type=int,
+            default=3,
+            help='Количество повторных попыток скачивания при сетевых ошибках'
+        )
+
+        parser.add_argument(
+            '--max-image-size',
+            type=int,
+            default=MAX_IMAGE_SIZE,
+            help='Максимальный размер изображения в байтах; изображения больше пропускаются'
+        )
+
+        parser.add_argument(
+            '--report-json',
+            type=str,
+            help='Путь к файлу, в который будет записан отчет о времени этапов загрузки в формате JSON'
+        )
+
+        # load_all_places передает сюда общий ImportStats, чтобы собрать сводку по всем файлам
+        parser.add_argument('--import-stats', default=None, help=argparse.SUPPRESS)
+
+        # и общее множество ID изображений, чтобы обработать их одним пулом в конце загрузки
+        parser.add_argument('--pending-image-ids', default=None, help=argparse.SUPPRESS)
+
     def handle(self, *args, **options):
         json_source = options['json_source']
         force = options['force']
+        self.image_workers = options['image_workers']
+        self.max_image_size = options['max_image_size']
+
+        if self.image_workers < 1:
+            raise CommandError('--image-workers должен быть положительным числом')
+
+        if self.max_image_size < 1:
+            raise CommandError('--max-image-size должен быть положительным числом')
+
+        import_stats = options['import_stats']
+        owns_stats = import_stats is None
+        if owns_stats:
+            import_stats = ImportStats()
+        self.stats = import_stats.add_file(json_source)
+
+        pending_image_ids = options['pending_image_ids']
+        owns_pending_images = pending_image_ids is None
+        if owns_pending_images:
+            pending_image_ids = set()
+
+        self.session = create_session(self.image_workers, options['retries'])
         
         try:
-            if json_source.startswith(('http://', 'https://')):
-                raw_place = self._load_from_url(json_source)
-            else:
-                raw_place = self._load_from_file(json_source)
-                
-            self._load_place_data(raw_place, force)
+            with self.stats.measure('fetch'):
+                if json_source.startswith(('http://', 'https://')):
+                    raw_place = self._load_from_url(json_source)
+                else:
+                    raw_place = self._load_from_file(json_source)
+            
+            # Изображения обрабатываются после выхода из транзакции, чтобы не
+            # держать общую блокировку записи, пока работает пул процессов
+            with self.stats.measure_queries(), collect_image_processing(pending_image_ids):
+                self._load_place_data(raw_place, force)
             
         except Exception as e:
             raise CommandError(f'Ошибка загрузки данных: {e}')
+        finally:
+            self.session.close()
+            if owns_pending_images and pending_image_ids:
+                with self.stats.measure('processing'):
+                    self._process_images(pending_image_ids)
+            self.stats.finish()
+
+        if owns_stats:
+            import_stats.finish()
+            for line in import_stats.format_summary():
+                self.stdout.write(line)
+            if options['report_json']:
+                import_stats.write_json(options['report_json'])
+                self.stdout.write(f'Отчет записан в {options["report_json"]}')
 
     def _load_from_url(self, url):
         """Загружает JSON данные из URL"""
         self.stdout.write(f'Загрузка данных из URL: {url}')
         
         try:
-            response = requests.get(url, timeout=30)
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -69,19 +152,31 @@ class Command(BaseCommand):
             raise CommandError(f'Ошибка парсинга JSON файла: {e}')
 
     def _load_place_data(self, raw_place, force):
-        """Загружает данные о месте в базу данных"""
-        required_fields = ['title', 'description_short', 'description_long', 'coordinates']
-        for field in required_fields:
-            if field not in raw_place:
-                raise CommandError(f'Отсутствует обязательное поле: {field}')
-        
-        coordinates = raw_place['coordinates']
-        if 'lat' not in coordinates or 'lng' not in coordinates:
-            raise CommandError('Отсутствуют координаты (lat, lng)')
+        """Загружает данные о месте в базу данных, применяя только изменения"""
+        try:
+            validate_raw_place(raw_place)
+        except ValueError as e:
+            raise CommandError(e)
         
         title = raw_place['title']
+        source_hash = get_raw_place_hash(raw_place)
+        
+        existing_place = Place.objects.filter(title=title).first()
+        if existing_place and not force:
+            self._warn_place_exists(title)
+            return
+        
+        if existing_place and existing_place.source_hash == source_hash:
+            self.stdout.write(f'Место "{title}" не изменилось.')
+            return
+        
+        coordinates = raw_place['coordinates']
+        image_urls = raw_place.get('imgs', [])
+        image_blobs = self._fetch_image_blobs(
+            self._get_new_image_urls(existing_place, image_urls)
+        )
         
-        with transaction.atomic():
+        with db_write_lock, transaction.atomic():
             place, created = Place.objects.get_or_create(
                 title=title,
                 defaults={
@@ -93,9 +188,7 @@ class Command(BaseCommand):
             )
             
             if not created and not force:
-                self.stdout.write(
-                    self.style.WARNING(f'Место "{title}" уже существует. Используйте --force для перезаписи.')
-                )
+                self._warn_place_exists(title)
                 return
             
             if not created and force:
@@ -103,10 +196,9 @@ class Command(BaseCommand):
                 place.long_description = raw_place['description_long']
                 place.latitude = coordinates['lat']
                 place.longitude = coordinates['lng']
+                place.source_hash = ''
                 place.save()
                 
-                place.images.all().delete()
-                
                 self.stdout.write(
                     self.style.SUCCESS(f'Место "{title}" обновлено.')
                 )
@@ -115,41 +207,139 @@ class Command(BaseCommand):
                     self.style.SUCCESS(f'Место "{title}" создано.')
                 )
             
-            if 'imgs' in raw_place:
-                self._load_place_images(place, raw_place['imgs'])
+            failed_count = self._sync_place_images(place, image_urls, image_blobs)
+            
+            # Хэш сохраняется, только если все изображения на месте: иначе повторный
+            # запуск с --force счел бы место неизменившимся и не догрузил бы их
+            if not failed_count:
+                Place.objects.filter(pk=place.pk).update(source_hash=source_hash)
+        
+        if failed_count:
+            raise CommandError(
+                f'Не удалось загрузить изображений: {failed_count}. '
+                'Запустите загрузку с --force еще раз, чтобы догрузить их'
+            )
+
+    def _process_images(self, image_ids):
+        """Рассчитывает метаданные и уменьшенные копии сохранённых изображений места"""
+        _, errors = process_image_ids(image_ids)
+        for image, error in errors:
+            self.stdout.write(
+                self.style.ERROR(f'  Ошибка обработки {image.image.name}: {error}')
+            )
+
+    def _warn_place_exists(self, title):
+        self.stdout.write(
+            self.style.WARNING(f'Место "{title}" уже существует. Используйте --force для перезаписи.')
+        )
+
+    def _get_new_image_urls(self, place, image_urls):
+        """Возвращает URL изображений, которых у места еще нет и которые нужно скачать"""
+        known_urls = set()
+        if place:
+            known_urls = set(place.images.exclude(source_url='').values_list('source_url', flat=True))
+        return list(dict.fromkeys(url for url in image_urls if url not in known_urls))
 
-    def _load_place_images(self, place, image_urls):
-        """Загружает изображения для места"""
+    def _fetch_image_blobs(self, image_urls):
+        """Скачивает изображения параллельно до начала транзакции и возвращает {URL: (имя файла, SHA-256) или исключение}"""
+        if not image_urls:
+            return {}
+        
         self.stdout.write(f'Загрузка {len(image_urls)} изображений...')
+        return fetch_image_blobs(
+            self.session,
+            image_urls,
+            self.image_workers,
+            self.max_image_size,
+            stats=self.stats
+        )
+
+    def _sync_place_images(self, place, image_urls, image_blobs):
+        """Приводит изображения места к списку image_urls и возвращает количество изображений, которые не удалось загрузить"""
+        # Изображения с известным URL или тем же содержимым переиспользуются, исчезнувшие из списка удаляются
+        existing_images = list(place.images.all())
+        
+        images_by_url = {}
+        for image in existing_images:
+            if image.source_url:
+                images_by_url.setdefault(image.source_url, []).append(image)
         
+        planned_images = []
         for order, image_url in enumerate(image_urls):
+            same_url_images = images_by_url.get(image_url)
+            planned_images.append((order, image_url, same_url_images.pop(0) if same_url_images else None))
+        
+        kept_image_ids = {image.id for _, _, image in planned_images if image}
+        removed_images = [image for image in existing_images if image.id not in kept_image_ids]
+        
+        removed_images_by_hash = {}
+        if image_blobs:
+            for image in removed_images:
+                content_hash = image.content_hash or self._get_image_file_hash(image)
+                removed_images_by_hash.setdefault(content_hash, []).append(image)
+        
+        kept_count = 0
+        added_count = 0
+        failed_count = 0
+        for order, image_url, image in planned_images:
+            if image:
+                if image.order != order:
+                    image.order = order
+                    image.save(update_fields=['order'])
+                kept_count += 1
+                continue
+            
             try:
-                self._download_and_save_image(place, image_url, order)
+                image_blob = image_blobs.get(image_url)
+                if image_blob is None:
+                    raise Exception('Изображение не было скачано')
+                if isinstance(image_blob, Exception):
+                    raise image_blob
+                
+                image_name, content_hash = image_blob
+                same_content_images = removed_images_by_hash.get(content_hash)
+                if same_content_images:
+                    reused_image = same_content_images.pop()
+                    removed_images.remove(reused_image)
+                    reused_image.order = order
+                    reused_image.source_url = image_url
+                    reused_image.content_hash = content_hash
+                    reused_image.save(update_fields=['order', 'source_url', 'content_hash'])
+                else:
+                    self._save_image(place, image_url, image_name, content_hash, order)
+                added_count += 1
                 self.stdout.write(f'  Загружено изображение {order + 1}/{len(image_urls)}')
             except Exception as e:
+                failed_count += 1
                 self.stdout.write(
                     self.style.ERROR(f'  Ошибка загрузки изображения {image_url}: {e}')
                 )
+        
+        for image in removed_images:
+            image.delete()
+        
+        self.stdout.write(
+            f'Изображения: без изменений {kept_count}, добавлено {added_count}, удалено {len(removed_images)}'
+        )
+        return failed_count
 
-    def _download_and_save_image(self, place, image_url, order):
-        """Скачивает и сохраняет изображение"""
+    def _get_image_file_hash(self, image):
+        """Считает хэш файла изображения, загруженного до появления хэшей"""
+        try:
+            return get_file_hash(image.image)
+        except (OSError, ValueError):
+            return f'missing-{image.id}'
+
+    def _save_image(self, place, image_url, image_name, content_hash, order):
+        """Создает изображение места, ссылающееся на уже сохранённый файл"""
         try:
-            response = requests.get(image_url, timeout=30)
-            response.raise_for_status()
-            
-            parsed_url = urlparse(image_url)
-            filename = os.path.basename(parsed_url.path)
-            
-            if not filename:
-                filename = f'image_{order}.jpg'
-            
             PlaceImage.objects.create(
                 place=place,
                 order=order,
-                image=ContentFile(response.content, name=filename)
+                source_url=image_url,
+                content_hash=content_hash,
+                image=image_name
             )
             
-        except requests.RequestException as e:
-            raise Exception(f'Ошибка скачивания изображения: {e}')
         except Exception as e:
-            raise Exception(f'Ошибка сохранения изображения: {e}') 
\ No newline at end of file
+            raise Exception(f'Ошибка сохранения изображения: {e}')
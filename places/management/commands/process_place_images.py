@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from places.models import PlaceImage
+from places.processing import process_images
+
+
+class Command(BaseCommand):
+    help = 'Рассчитывает метаданные и уменьшенные копии WebP и JPEG для изображений мест, у которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Заново обработать все изображения'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.PLACES_IMAGE_VARIANTS_WORKERS,
+            help='Количество процессов, обрабатывающих изображения'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Количество изображений, загружаемых из базы за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        batch_size = options['batch_size']
+
+        if workers < 1 or batch_size < 1:
+            raise CommandError('--workers и --batch-size должны быть положительными числами')
+
+        images = PlaceImage.objects.order_by('id')
+        if not options['force']:
+            images = images.filter(Q(variants=[]) | Q(width__isnull=True))
+
+        image_ids = list(images.values_list('id', flat=True))
+        self.stdout.write(f'Изображений для обработки: {len(image_ids)}')
+
+        processed_count = 0
+        errors_count = 0
+        for start in range(0, len(image_ids), batch_size):
+            batch = PlaceImage.objects.filter(id__in=image_ids[start:start + batch_size])
+            processed, errors = process_images(batch, workers)
+            processed_count += processed
+            errors_count += len(errors)
+
+            for image, error in errors:
+                self.stdout.write(
+                    self.style.ERROR(f'  Ошибка обработки {image.image.name}: {error}')
+                )
+
+            self.stdout.write(f'Обработано {min(start + batch_size, len(image_ids))}/{len(image_ids)}')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Изображения обработаны: {processed_count}, ошибок: {errors_count}')
+        )
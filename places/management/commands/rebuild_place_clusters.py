@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from places.clusters import rebuild_clusters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает кластеры меток карты для всех уровней масштаба'
+
+    def handle(self, *args, **options):
+        clusters_count = rebuild_clusters()
+        self.stdout.write(
+            self.style.SUCCESS(f'Кластеры пересчитаны: {clusters_count}')
+        )
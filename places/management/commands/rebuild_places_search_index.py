@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from places.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает полнотекстовый индекс мест для поиска'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            places_count = rebuild_search_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'Полнотекстовый индекс пересобран: {places_count} мест')
+        )
@@ -0,0 +1,142 @@
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+
+METRICS_PREFIX = 'where_to_go'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+
+class ViewMetrics:
+    """Накопленные метрики одного представления"""
+
+    __slots__ = ('buckets', 'duration_sum', 'count', 'statuses', 'queries', 'queries_duration', 'response_bytes')
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.duration_sum = 0.0
+        self.count = 0
+        self.statuses = defaultdict(int)
+        self.queries = 0
+        self.queries_duration = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    """Метрики запросов процесса: гистограммы времени ответа, SQL-запросы и размер ответов по представлениям"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewMetrics)
+
+    def observe(self, view, method, status, duration, queries, queries_duration, response_bytes):
+        """Учитывает завершившийся запрос"""
+        with self._lock:
+            metrics = self._views[(view, method)]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+            metrics.duration_sum += duration
+            metrics.count += 1
+            metrics.statuses[status] += 1
+            metrics.queries += queries
+            metrics.queries_duration += queries_duration
+            metrics.response_bytes += response_bytes
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus"""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                f'# HELP {METRICS_PREFIX}_request_duration_seconds Время обработки запроса',
+                f'# TYPE {METRICS_PREFIX}_request_duration_seconds histogram',
+            ]
+            for (view, method), metrics in views:
+                labels = _format_labels(view=view, method=method)
+                for bound, bucket_count in zip(DURATION_BUCKETS, metrics.buckets):
+                    lines.append(
+                        f'{METRICS_PREFIX}_request_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket_count}'
+                    )
+                lines.append(f'{METRICS_PREFIX}_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}')
+                lines.append(f'{METRICS_PREFIX}_request_duration_seconds_sum{{{labels}}} {metrics.duration_sum}')
+                lines.append(f'{METRICS_PREFIX}_request_duration_seconds_count{{{labels}}} {metrics.count}')
+
+            lines += [
+                f'# HELP {METRICS_PREFIX}_requests_total Количество запросов по статусу ответа',
+                f'# TYPE {METRICS_PREFIX}_requests_total counter',
+            ]
+            for (view, method), metrics in views:
+                for status, status_count in sorted(metrics.statuses.items()):
+                    labels = _format_labels(view=view, method=method, status=status)
+                    lines.append(f'{METRICS_PREFIX}_requests_total{{{labels}}} {status_count}')
+
+            counters = (
+                ('db_queries_total', 'Количество SQL-запросов', 'queries'),
+                ('db_query_duration_seconds_total', 'Суммарное время SQL-запросов', 'queries_duration'),
+                ('response_size_bytes_total', 'Суммарный размер тел ответов', 'response_bytes'),
+            )
+            for name, description, field in counters:
+                lines += [
+                    f'# HELP {METRICS_PREFIX}_{name} {description}',
+                    f'# TYPE {METRICS_PREFIX}_{name} counter',
+                ]
+                for (view, method), metrics in views:
+                    labels = _format_labels(view=view, method=method)
+                    lines.append(f'{METRICS_PREFIX}_{name}{{{labels}}} {getattr(metrics, field)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class QueriesCollector:
+    """Счетчик SQL-запросов одного HTTP-запроса и их времени"""
+
+    def __init__(self, keep_sql=False):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def add(self, sql, duration):
+        self.count += 1
+        self.duration += duration
+        if self.keep_sql:
+            self.statements.append((duration, sql))
+
+
+# Переменная контекста, а не атрибут соединения: асинхронные представления
+# выполняют запросы ORM в других потоках, но контекст туда копируется.
+current_queries_collector = ContextVar('current_queries_collector', default=None)
+
+
+def collect_queries(execute, sql, params, many, context):
+    """Обертка выполнения SQL для connection.execute_wrappers, передающая запросы текущему счетчику"""
+    collector = current_queries_collector.get()
+    if collector is None:
+        return execute(sql, params, many, context)
+
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        collector.add(sql, perf_counter() - started)
+
+
+def install_queries_collector(sender, connection, **kwargs):
+    """Подключает подсчет SQL-запросов к новому соединению с базой; подключается в PlacesConfig.ready"""
+    if collect_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(collect_queries)
+
+
+registry = MetricsRegistry()
+
+
+def _format_labels(**labels):
+    return ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items())
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,118 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import UNRESOLVED_VIEW, QueriesCollector, current_queries_collector, registry
+
+
+logger = logging.getLogger(__name__)
+
+# Сколько самых долгих SQL-запросов попадает в журнал медленных запросов
+SLOW_REQUEST_MAX_SQL = 50
+
+
+class RequestMetricsMiddleware:
+    """Собирает время ответа, SQL-запросы и размер ответа по представлениям и пишет в журнал медленные запросы"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_request_threshold = settings.METRICS_SLOW_REQUEST_MS / 1000
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        collector = QueriesCollector(keep_sql=self.slow_request_threshold > 0)
+        token = current_queries_collector.set(collector)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries_collector.reset(token)
+        self._observe_response(request, response, started, collector)
+        return response
+
+    async def __acall__(self, request):
+        collector = QueriesCollector(keep_sql=self.slow_request_threshold > 0)
+        token = current_queries_collector.set(collector)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries_collector.reset(token)
+        self._observe_response(request, response, started, collector)
+        return response
+
+    def _observe_response(self, request, response, started, collector):
+        # Файл WSGI-сервер может отдать мимо streaming_content, поэтому он учитывается по Content-Length
+        if not response.streaming or getattr(response, 'file_to_stream', None) is not None:
+            response_bytes = int(response.get('Content-Length', 0)) if response.streaming else len(response.content)
+            self._observe(request, response, time.perf_counter() - started, collector, response_bytes)
+            return
+
+        # Тело потокового ответа формируется уже после выхода из middleware, вместе
+        # с SQL-запросами, поэтому метрики записываются, когда тело отдано целиком
+        content = response.streaming_content
+        if response.is_async:
+            response.streaming_content = self._aobserve_streaming(request, response, content, started, collector)
+        else:
+            response.streaming_content = self._observe_streaming(request, response, content, started, collector)
+
+    def _observe_streaming(self, request, response, content, started, collector):
+        previous_collector = current_queries_collector.get()
+        current_queries_collector.set(collector)
+        response_bytes = 0
+        try:
+            for chunk in content:
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            current_queries_collector.set(previous_collector)
+            self._observe(request, response, time.perf_counter() - started, collector, response_bytes)
+
+    async def _aobserve_streaming(self, request, response, content, started, collector):
+        previous_collector = current_queries_collector.get()
+        current_queries_collector.set(collector)
+        response_bytes = 0
+        try:
+            async for chunk in content:
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            current_queries_collector.set(previous_collector)
+            self._observe(request, response, time.perf_counter() - started, collector, response_bytes)
+
+    def _observe(self, request, response, duration, collector, response_bytes):
+        resolver_match = getattr(request, 'resolver_match', None)
+        view = resolver_match.view_name if resolver_match else UNRESOLVED_VIEW
+
+        registry.observe(
+            view,
+            request.method,
+            response.status_code,
+            duration,
+            collector.count,
+            collector.duration,
+            response_bytes
+        )
+
+        if self.slow_request_threshold and duration >= self.slow_request_threshold:
+            statements = sorted(collector.statements, reverse=True)[:SLOW_REQUEST_MAX_SQL]
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, статус %s, SQL-запросов %d (%.0f мс)%s',
+                request.method,
+                request.get_full_path(),
+                view,
+                duration * 1000,
+                response.status_code,
+                collector.count,
+                collector.duration * 1000,
+                ''.join(f'\n  {statement_duration * 1000:.1f} мс  {sql}' for statement_duration, sql in statements)
+            )
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0009_alter_placeimage_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="place",
+            index=models.Index(
+                fields=["latitude", "longitude"], name="place_coordinates_idx"
+            ),
+        ),
+    ]
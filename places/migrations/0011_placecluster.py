@@ -0,0 +1,136 @@
+# Generated by Django 5.2 on 2026-10-18 08:39
+
+import math
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копия логики places.clusters на момент миграции: миграция не должна
+# зависеть от кода приложения, который может измениться позже.
+MIN_ZOOM = 0
+MAX_ZOOM = 16
+TILE_SIZE = 256
+CELL_SIZE = 64
+MAX_MERCATOR_LATITUDE = 85.0511287798
+
+
+def get_place_cell(latitude, longitude, zoom):
+    cells_count = TILE_SIZE * 2**zoom // CELL_SIZE
+    latitude = min(max(latitude, -MAX_MERCATOR_LATITUDE), MAX_MERCATOR_LATITUDE)
+    x = (longitude + 180) / 360
+    sin_latitude = math.sin(math.radians(latitude))
+    y = 0.5 - math.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * math.pi)
+    x = min(max(x, 0.0), 1 - 1e-12)
+    y = min(max(y, 0.0), 1 - 1e-12)
+    return int(x * cells_count), int(y * cells_count)
+
+
+def build_clusters(places):
+    clusters = defaultdict(
+        lambda: {
+            "places_count": 0,
+            "latitude_sum": 0.0,
+            "longitude_sum": 0.0,
+            "place_id": None,
+        }
+    )
+
+    for place_id, latitude, longitude in places:
+        latitude, longitude = float(latitude), float(longitude)
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            cell_x, cell_y = get_place_cell(latitude, longitude, zoom)
+            cluster = clusters[zoom, cell_x, cell_y]
+            cluster["places_count"] += 1
+            cluster["latitude_sum"] += latitude
+            cluster["longitude_sum"] += longitude
+            cluster["place_id"] = place_id if cluster["places_count"] == 1 else None
+
+    return clusters
+
+
+def populate_clusters(apps, schema_editor):
+    Place = apps.get_model("places", "Place")
+    PlaceCluster = apps.get_model("places", "PlaceCluster")
+
+    clusters = build_clusters(Place.objects.values_list("id", "latitude", "longitude"))
+    PlaceCluster.objects.bulk_create(
+        [
+            PlaceCluster(zoom=zoom, cell_x=cell_x, cell_y=cell_y, **cluster)
+            for (zoom, cell_x, cell_y), cluster in clusters.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0010_add_place_coordinates_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlaceCluster",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "zoom",
+                    models.PositiveSmallIntegerField(verbose_name="Уровень масштаба"),
+                ),
+                (
+                    "cell_x",
+                    models.PositiveIntegerField(verbose_name="Ячейка сетки по X"),
+                ),
+                (
+                    "cell_y",
+                    models.PositiveIntegerField(verbose_name="Ячейка сетки по Y"),
+                ),
+                (
+                    "places_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Количество мест"
+                    ),
+                ),
+                (
+                    "latitude_sum",
+                    models.FloatField(default=0, verbose_name="Сумма широт"),
+                ),
+                (
+                    "longitude_sum",
+                    models.FloatField(default=0, verbose_name="Сумма долгот"),
+                ),
+                (
+                    "place",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="places.place",
+                        verbose_name="Единственное место кластера",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Кластер мест",
+                "verbose_name_plural": "Кластеры мест",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("zoom", "cell_x", "cell_y"),
+                        name="place_cluster_cell_unique",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_clusters, migrations.RunPython.noop),
+    ]
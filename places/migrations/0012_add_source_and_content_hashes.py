@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0011_placecluster"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="place",
+            name="source_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="SHA-256 JSON, из которого место было загружено (заполняется автоматически)",
+                max_length=64,
+                verbose_name="Хэш исходных данных",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="SHA-256 файла изображения (заполняется автоматически)",
+                max_length=64,
+                verbose_name="Хэш содержимого",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="source_url",
+            field=models.URLField(
+                blank=True,
+                editable=False,
+                help_text="Адрес, с которого изображение было скачано (заполняется автоматически)",
+                max_length=2000,
+                verbose_name="URL источника",
+            ),
+        ),
+    ]
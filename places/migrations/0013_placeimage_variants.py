@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0012_add_source_and_content_hashes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="placeimage",
+            name="variants",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                help_text="Уменьшенные копии изображения в форматах WebP и JPEG (заполняется автоматически)",
+                verbose_name="Уменьшенные копии",
+            ),
+        ),
+    ]
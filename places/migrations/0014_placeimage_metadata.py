@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-18 08:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0013_placeimage_variants"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="placeimage",
+            name="dominant_color",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                help_text="Самый частый цвет изображения в виде #rrggbb (заполняется автоматически)",
+                max_length=7,
+                verbose_name="Основной цвет",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="file_size",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Размер файла изображения в байтах (заполняется автоматически)",
+                null=True,
+                verbose_name="Размер файла",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Высота изображения в пикселях (заполняется автоматически)",
+                null=True,
+                verbose_name="Высота",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="placeholder",
+            field=models.TextField(
+                blank=True,
+                editable=False,
+                help_text="Крошечная копия изображения в виде data URI для показа до загрузки (заполняется автоматически)",
+                verbose_name="Заглушка",
+            ),
+        ),
+        migrations.AddField(
+            model_name="placeimage",
+            name="width",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                help_text="Ширина изображения в пикселях (заполняется автоматически)",
+                null=True,
+                verbose_name="Ширина",
+            ),
+        ),
+    ]
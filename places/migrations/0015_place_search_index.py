@@ -0,0 +1,49 @@
+import html
+
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+# Имя таблицы и подготовка строк скопированы из places.search на момент
+# миграции: миграция не должна зависеть от кода приложения.
+SEARCH_TABLE = "places_place_fts"
+
+
+def strip_html(text):
+    return html.unescape(strip_tags(text))
+
+
+def populate_search_index(apps, schema_editor):
+    Place = apps.get_model("places", "Place")
+
+    rows = [
+        (place_id, title, strip_html(short_description), strip_html(long_description))
+        for place_id, title, short_description, long_description in Place.objects.values_list(
+            "id", "title", "short_description", "long_description"
+        )
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, short_description, long_description) "
+            "VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0014_placeimage_metadata"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                "title, short_description, long_description, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ),
+            reverse_sql=f"DROP TABLE {SEARCH_TABLE}",
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+# Сетка скопирована из places.geo на момент миграции: миграция не должна
+# зависеть от кода приложения, который может измениться позже.
+NEARBY_CELL_SIZE = 0.1
+NEARBY_ROWS = 1800
+NEARBY_COLUMNS = 3600
+
+
+def get_nearby_cell(latitude, longitude):
+    latitude, longitude = float(latitude), float(longitude)
+    if not -180 <= longitude <= 180:
+        longitude = (longitude + 180) % 360 - 180
+    row = min(int((latitude + 90) / NEARBY_CELL_SIZE), NEARBY_ROWS - 1)
+    column = min(int((longitude + 180) / NEARBY_CELL_SIZE), NEARBY_COLUMNS - 1)
+    return row * NEARBY_COLUMNS + column
+
+
+def populate_nearby_cells(apps, schema_editor):
+    Place = apps.get_model("places", "Place")
+
+    places = list(Place.objects.only("id", "latitude", "longitude"))
+    for place in places:
+        place.nearby_cell = get_nearby_cell(place.latitude, place.longitude)
+    Place.objects.bulk_update(places, ["nearby_cell"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("places", "0015_place_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="place",
+            name="nearby_cell",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                default=0,
+                editable=False,
+                help_text="Рассчитывается по координатам при сохранении места",
+                verbose_name="Ячейка сетки поиска ближайших мест",
+            ),
+        ),
+        migrations.RunPython(populate_nearby_cells, migrations.RunPython.noop),
+    ]
@@ -37,10 +37,29 @@ class Place(models.Model):
         verbose_name='Долгота'
     )
     
+    source_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='Хэш исходных данных',
+        help_text='SHA-256 JSON, из которого место было загружено (заполняется автоматически)'
+    )
+    
+    nearby_cell = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        editable=False,
+        verbose_name='Ячейка сетки поиска ближайших мест',
+        help_text='Рассчитывается по координатам при сохранении места'
+    )
+    
     class Meta:
         verbose_name = 'Место'
         verbose_name_plural = 'Места'
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['latitude', 'longitude'], name='place_coordinates_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -67,6 +86,69 @@ class PlaceImage(models.Model):
         help_text='Порядок отображения изображения (заполняется автоматически)'
     )
     
+    source_url = models.URLField(
+        max_length=2000,
+        blank=True,
+        editable=False,
+        verbose_name='URL источника',
+        help_text='Адрес, с которого изображение было скачано (заполняется автоматически)'
+    )
+    
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        editable=False,
+        verbose_name='Хэш содержимого',
+        help_text='SHA-256 файла изображения (заполняется автоматически)'
+    )
+    
+    variants = models.JSONField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии',
+        help_text='Уменьшенные копии изображения в форматах WebP и JPEG (заполняется автоматически)'
+    )
+    
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина',
+        help_text='Ширина изображения в пикселях (заполняется автоматически)'
+    )
+    
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота',
+        help_text='Высота изображения в пикселях (заполняется автоматически)'
+    )
+    
+    file_size = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Размер файла',
+        help_text='Размер файла изображения в байтах (заполняется автоматически)'
+    )
+    
+    dominant_color = models.CharField(
+        max_length=7,
+        blank=True,
+        editable=False,
+        verbose_name='Основной цвет',
+        help_text='Самый частый цвет изображения в виде #rrggbb (заполняется автоматически)'
+    )
+    
+    placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='Заглушка',
+        help_text='Крошечная копия изображения в виде data URI для показа до загрузки (заполняется автоматически)'
+    )
+    
     class Meta:
         verbose_name = 'Изображение места'
         verbose_name_plural = 'Изображения мест'
@@ -76,4 +158,60 @@ class PlaceImage(models.Model):
         ]
     
     def __str__(self):
-        return f"Изображение {self.order} для {self.place.title}"
\ No newline at end of file
+        return f"Изображение {self.order} для {self.place.title}"
+
+    def get_variants(self, variant_format):
+        """Возвращает уменьшенные копии изображения в формате variant_format по возрастанию ширины"""
+        return sorted(
+            (variant for variant in self.variants if variant['format'] == variant_format),
+            key=lambda variant: variant['width']
+        )
+
+    def get_variant_url(self, width, variant_format='jpeg'):
+        """Возвращает URL наименьшей копии шириной не меньше width (или самой большой копии), а если копий нет - оригинала"""
+        variants = self.get_variants(variant_format)
+        if not variants:
+            return self.image.url
+        suitable = [variant for variant in variants if variant['width'] >= width] or variants[-1:]
+        return self.image.storage.url(suitable[0]['name'])
+
+class PlaceCluster(models.Model):
+    """Модель для хранения предрассчитанных кластеров меток для уровня масштаба карты"""
+
+    zoom = models.PositiveSmallIntegerField(verbose_name='Уровень масштаба')
+    cell_x = models.PositiveIntegerField(verbose_name='Ячейка сетки по X')
+    cell_y = models.PositiveIntegerField(verbose_name='Ячейка сетки по Y')
+
+    places_count = models.PositiveIntegerField(default=0, verbose_name='Количество мест')
+    latitude_sum = models.FloatField(default=0, verbose_name='Сумма широт')
+    longitude_sum = models.FloatField(default=0, verbose_name='Сумма долгот')
+
+    place = models.ForeignKey(
+        Place,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Единственное место кластера'
+    )
+
+    class Meta:
+        verbose_name = 'Кластер мест'
+        verbose_name_plural = 'Кластеры мест'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['zoom', 'cell_x', 'cell_y'],
+                name='place_cluster_cell_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f'Кластер {self.zoom}/{self.cell_x}/{self.cell_y} ({self.places_count} мест)'
+
+    @property
+    def latitude(self):
+        return self.latitude_sum / self.places_count
+
+    @property
+    def longitude(self):
+        return self.longitude_sum / self.places_count
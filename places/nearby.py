@@ -0,0 +1,33 @@
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from .geo import get_distance, get_nearby_cell_ranges
+from .models import Place
+
+
+DEFAULT_NEARBY_RADIUS = 1000
+MAX_NEARBY_RADIUS = 50000
+
+DEFAULT_NEARBY_LIMIT = 20
+MAX_NEARBY_LIMIT = 100
+
+
+def find_nearby_places(latitude, longitude, radius, limit):
+    """Возвращает список пар (место, расстояние в метрах) в радиусе radius от точки по возрастанию расстояния"""
+    # Из базы выбираются только места из ячеек сетки, покрывающих круг
+    cell_filter = reduce(or_, (
+        Q(nearby_cell__range=cell_range)
+        for cell_range in get_nearby_cell_ranges(latitude, longitude, radius)
+    ))
+    candidates = Place.objects.filter(cell_filter).values_list('id', 'title', 'latitude', 'longitude')
+
+    places = []
+    for place in candidates:
+        distance = get_distance(latitude, longitude, float(place[2]), float(place[3]))
+        if distance <= radius:
+            places.append((place, distance))
+
+    places.sort(key=lambda place_with_distance: place_with_distance[1])
+    return places[:limit]
@@ -0,0 +1,234 @@
+import contextlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from .blobs import is_image_blob
+from .cache import invalidate_places_details
+from .images import VARIANT_EXTENSIONS, process_image
+from .models import PlaceImage
+
+
+PROCESSING_CHUNK_SIZE = 16
+
+IMAGE_IDS_CHUNK_SIZE = 500
+
+METADATA_FIELDS = ['width', 'height', 'file_size', 'dominant_color', 'placeholder']
+
+_pending = threading.local()
+
+
+def process_images(images, workers=None):
+    """Рассчитывает в пуле процессов метаданные и копии изображений и возвращает их число и список пар (изображение, ошибка)"""
+    if workers is None:
+        workers = settings.PLACES_IMAGE_VARIANTS_WORKERS
+
+    images = [image for image in images if image.image]
+    processed_count = 0
+    errors = []
+
+    executor = None
+    if workers > 1 and len(images) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(images)))
+
+    try:
+        for start in range(0, len(images), PROCESSING_CHUNK_SIZE):
+            chunk = images[start:start + PROCESSING_CHUNK_SIZE]
+            processed, chunk_errors = _process_images_chunk(chunk, executor)
+            processed_count += processed
+            errors.extend(chunk_errors)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return processed_count, errors
+
+
+def process_image_ids(image_ids, workers=None):
+    """Обрабатывает изображения по списку ID, загружая их из базы порциями"""
+    image_ids = sorted(image_ids)
+    processed_count = 0
+    errors = []
+    for start in range(0, len(image_ids), IMAGE_IDS_CHUNK_SIZE):
+        processed, chunk_errors = process_images(
+            PlaceImage.objects.filter(id__in=image_ids[start:start + IMAGE_IDS_CHUNK_SIZE]),
+            workers
+        )
+        processed_count += processed
+        errors.extend(chunk_errors)
+    return processed_count, errors
+
+
+def schedule_image_processing(image_id):
+    """Откладывает обработку изображения до фиксации транзакции, а внутри collect_image_processing собирает его ID"""
+    collected_ids = getattr(_pending, 'collected_ids', None)
+    if collected_ids is not None:
+        transaction.on_commit(partial(collected_ids.add, image_id))
+        return
+
+    if not hasattr(_pending, 'image_ids'):
+        _pending.image_ids = set()
+    _pending.image_ids.add(image_id)
+    transaction.on_commit(process_pending_images)
+
+
+@contextlib.contextmanager
+def collect_image_processing(image_ids):
+    """Вместо обработки после фиксации транзакций добавляет в image_ids изображения, сохранённые в блоке"""
+    previous_ids = getattr(_pending, 'collected_ids', None)
+    _pending.collected_ids = image_ids
+    try:
+        yield image_ids
+    finally:
+        _pending.collected_ids = previous_ids
+
+
+def process_pending_images():
+    """Обрабатывает изображения, отложенные в текущем потоке, не запуская пул процессов"""
+    image_ids = getattr(_pending, 'image_ids', None)
+    _pending.image_ids = set()
+    if image_ids:
+        # Сохранение из админки выполняется в процессе веб-сервера, запускать
+        # в нем пул процессов на каждый запрос дороже самой обработки
+        process_image_ids(image_ids, workers=1)
+
+
+def _process_images_chunk(chunk, executor):
+    processed_count = 0
+    errors = []
+    # Общий для нескольких изображений файл обрабатывается один раз, остальные получают готовый результат
+    shared_results = _get_shared_results(chunk)
+
+    to_process = []
+    processed_names = set()
+    for image in chunk:
+        name = image.image.name
+        if name in shared_results or name in processed_names:
+            continue
+        if is_image_blob(name):
+            processed_names.add(name)
+        to_process.append(image)
+
+    for image, result in zip(to_process, _process_chunk(to_process, executor)):
+        _delete_variants(image)
+        if isinstance(result, Exception):
+            errors.append((image, result))
+            continue
+        result['variants'] = _save_variants(image, result['variants'])
+        _apply_result(image, result)
+        if is_image_blob(image.image.name):
+            shared_results[image.image.name] = result
+        processed_count += 1
+
+    processed_ids = {image.id for image in to_process}
+    for image in chunk:
+        if image.id not in processed_ids and image.image.name in shared_results:
+            _delete_variants(image)
+            _apply_result(image, shared_results[image.image.name])
+            processed_count += 1
+
+    PlaceImage.objects.bulk_update(chunk, ['variants', *METADATA_FIELDS])
+    invalidate_places_details({image.place_id for image in chunk})
+
+    return processed_count, errors
+
+
+def _get_shared_results(images):
+    names = [image.image.name for image in images if is_image_blob(image.image.name)]
+    if not names:
+        return {}
+
+    image_ids = [image.id for image in images]
+    shared_images = PlaceImage.objects.filter(
+        image__in=names,
+        width__isnull=False
+    ).exclude(id__in=image_ids).exclude(variants=[])
+    return {
+        result.pop('image'): result
+        for result in shared_images.values('image', 'variants', *METADATA_FIELDS)
+    }
+
+
+def _apply_result(image, result):
+    image.variants = result['variants']
+    for field in METADATA_FIELDS:
+        setattr(image, field, result[field])
+
+
+def _process_chunk(images, executor):
+    sources = [_get_image_source(image) for image in images]
+
+    if executor is None or len(images) < 2:
+        return [_process_safely(source) for source in sources]
+
+    futures = [
+        None if isinstance(source, Exception) else executor.submit(process_image, source)
+        for source in sources
+    ]
+    return [
+        source if future is None else _get_result(future)
+        for source, future in zip(sources, futures)
+    ]
+
+
+def _get_image_source(image):
+    # Файлы из локального хранилища процессы пула читают сами; содержимое
+    # читается в память только для хранилищ без локальных путей.
+    try:
+        return image.image.path
+    except NotImplementedError:
+        pass
+
+    try:
+        with image.image.open('rb') as f:
+            return f.read()
+    except (OSError, ValueError) as e:
+        return e
+
+
+def _process_safely(source):
+    if isinstance(source, Exception):
+        return source
+    try:
+        return process_image(source)
+    except Exception as e:
+        return e
+
+
+def _get_result(future):
+    try:
+        return future.result()
+    except Exception as e:
+        return e
+
+
+def _save_variants(image, rendered):
+    shared = is_image_blob(image.image.name)
+    directory = os.path.dirname(image.image.name)
+    if not shared:
+        directory = os.path.join(directory, 'variants')
+    stem = os.path.splitext(os.path.basename(image.image.name))[0]
+    storage = image.image.storage
+
+    variants = []
+    for width, variant_format, content in rendered:
+        name = os.path.join(directory, f'{stem}_{width}.{VARIANT_EXTENSIONS[variant_format]}')
+        if not (shared and storage.exists(name)):
+            name = storage.save(name, ContentFile(content))
+        variants.append({'width': width, 'format': variant_format, 'name': name})
+    return variants
+
+
+def _delete_variants(image):
+    # Копии общих файлов могут использоваться другими изображениями, поэтому,
+    # как и сами общие файлы, не удаляются.
+    storage = image.image.storage
+    for variant in image.variants:
+        if not is_image_blob(variant['name']):
+            storage.delete(variant['name'])
+    image.variants = []
@@ -0,0 +1,94 @@
+import json
+import sys
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .cache import get_data_version, get_versioned_payload
+from .models import Place
+from .serializers import serialize_place_values
+
+
+class PlacesSnapshot:
+    """Снимок всех мест в памяти процесса в виде колонок float, отсортированных по широте"""
+
+    __slots__ = ('version', 'ids', 'titles', 'latitudes', 'longitudes', '_features')
+
+    def __init__(self, version, place_rows):
+        place_rows = sorted(
+            ((place_id, sys.intern(title), float(latitude), float(longitude))
+             for place_id, title, latitude, longitude in place_rows),
+            key=lambda place_row: place_row[2]
+        )
+
+        self.version = version
+        self.ids = array('q', [place_row[0] for place_row in place_rows])
+        self.titles = [place_row[1] for place_row in place_rows]
+        self.latitudes = array('d', [place_row[2] for place_row in place_rows])
+        self.longitudes = array('d', [place_row[3] for place_row in place_rows])
+        self._features = [None] * len(place_rows)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find_in_bbox(self, bbox):
+        """Возвращает индексы мест, попадающих в область (west, south, east, north)"""
+        west, south, east, north = bbox
+        start = bisect_left(self.latitudes, south)
+        end = bisect_right(self.latitudes, north)
+        longitudes = self.longitudes
+
+        if west <= east:
+            return [index for index in range(start, end) if west <= longitudes[index] <= east]
+        return [index for index in range(start, end) if longitudes[index] >= west or longitudes[index] <= east]
+
+    def dump_geojson(self, indexes=None):
+        """Собирает байты GeoJSON FeatureCollection из мест с указанными индексами или из всех мест"""
+        if indexes is None:
+            indexes = range(len(self))
+        features = b','.join(self._get_feature(index) for index in indexes)
+        return b'{"type":"FeatureCollection","features":[' + features + b']}'
+
+    def _get_feature(self, index):
+        # GeoJSON места сериализуется при первом запросе и дальше переиспользуется
+        feature = self._features[index]
+        if feature is None:
+            feature = json.dumps(
+                serialize_place_values(
+                    self.ids[index],
+                    self.titles[index],
+                    self.latitudes[index],
+                    self.longitudes[index]
+                ),
+                ensure_ascii=False,
+                separators=(',', ':')
+            ).encode('utf-8')
+            self._features[index] = feature
+        return feature
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_places_snapshot():
+    """Возвращает снимок мест для текущей версии данных, пересобирая его после изменения мест"""
+    global _snapshot
+
+    version = get_data_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.version != version:
+            _snapshot = PlacesSnapshot(
+                version,
+                Place.objects.values_list('id', 'title', 'latitude', 'longitude').iterator()
+            )
+        return _snapshot
+
+
+def get_all_places_geojson_payload():
+    """Возвращает закэшированные для текущей версии данных байты GeoJSON всех мест, собранные из снимка"""
+    return get_versioned_payload('places_geojson', lambda: get_places_snapshot().dump_geojson())
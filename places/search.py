@@ -0,0 +1,114 @@
+import html
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .models import Place
+
+
+SEARCH_TABLE = 'places_place_fts'
+
+SEARCH_INDEX_CHUNK_SIZE = 500
+
+# Веса столбцов для bm25: совпадение в названии важнее, чем в описаниях
+TITLE_WEIGHT = 10.0
+SHORT_DESCRIPTION_WEIGHT = 4.0
+LONG_DESCRIPTION_WEIGHT = 1.0
+
+SNIPPET_TOKENS = 16
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+def get_search_row(place_id, title, short_description, long_description):
+    """Возвращает строку полнотекстового индекса для места, убирая HTML из описаний"""
+    return (place_id, title, strip_html(short_description), strip_html(long_description))
+
+
+def strip_html(text):
+    """Убирает из текста HTML-теги и раскрывает HTML-сущности"""
+    return html.unescape(strip_tags(text))
+
+
+def insert_search_rows(cursor, rows):
+    """Добавляет строки в полнотекстовый индекс"""
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (rowid, title, short_description, long_description) '
+        'VALUES (%s, %s, %s, %s)',
+        rows
+    )
+
+
+def index_places(places):
+    """Добавляет места в полнотекстовый индекс или обновляет их"""
+    rows = [
+        get_search_row(place.id, place.title, place.short_description, place.long_description)
+        for place in places
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        insert_search_rows(cursor, rows)
+
+
+def unindex_place(place_id):
+    """Удаляет место из полнотекстового индекса"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [place_id])
+
+
+def rebuild_search_index():
+    """Полностью пересобирает полнотекстовый индекс по всем местам"""
+    places = Place.objects.values_list('id', 'title', 'short_description', 'long_description')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        rows = []
+        for place in places.iterator(chunk_size=SEARCH_INDEX_CHUNK_SIZE):
+            rows.append(get_search_row(*place))
+            if len(rows) == SEARCH_INDEX_CHUNK_SIZE:
+                insert_search_rows(cursor, rows)
+                rows = []
+        insert_search_rows(cursor, rows)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+    return places.count()
+
+
+def build_match_query(raw_query):
+    """Превращает пользовательский запрос в запрос FTS5: ищутся места, содержащие все слова как префиксы"""
+    words = re.findall(r'\w+', raw_query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_places(raw_query, limit=None):
+    """Возвращает список (ID места, фрагмент текста с совпадением) по убыванию релевантности"""
+    match_query = build_match_query(raw_query)
+    if not match_query:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            SELECT rowid, snippet({SEARCH_TABLE}, -1, '', '', '…', {SNIPPET_TOKENS})
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s
+            ORDER BY bm25({SEARCH_TABLE}, {TITLE_WEIGHT}, {SHORT_DESCRIPTION_WEIGHT}, {LONG_DESCRIPTION_WEIGHT})
+            LIMIT %s
+            ''',
+            [match_query, -1 if limit is None else limit]
+        )
+        return cursor.fetchall()
+
+
+def filter_places(queryset, raw_query):
+    """Оставляет в queryset места, найденные полнотекстовым поиском"""
+    match_query = build_match_query(raw_query)
+    if not match_query:
+        return queryset.none()
+    # Подзапрос к индексу вместо списка ID не упирается в лимит переменных SQLite
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match_query])
+    )
@@ -0,0 +1,182 @@
+import json
+import urllib.parse
+from functools import cache
+
+from django.conf import settings
+from django.urls import reverse
+
+from .images import VARIANT_FORMATS
+
+
+PLACE_ID_PLACEHOLDER = 1234567890
+
+GEOJSON_STREAM_BUFFER_SIZE = 64 * 1024
+
+GEOJSON_STREAM_HEADER = b'{"type":"FeatureCollection","features":['
+GEOJSON_STREAM_FOOTER = b']}'
+
+
+@cache
+def get_place_details_url_pattern():
+    """Возвращает шаблон URL деталей места, чтобы не вызывать reverse для каждого места"""
+    url = reverse('place_details', kwargs={'place_id': PLACE_ID_PLACEHOLDER})
+    return url.replace(str(PLACE_ID_PLACEHOLDER), '{place_id}')
+
+
+def get_place_details_url(place_id):
+    """Возвращает URL JSON с деталями места"""
+    return get_place_details_url_pattern().format(place_id=place_id)
+
+
+def serialize_place_feature(place):
+    """Преобразует место в GeoJSON Feature для отображения на карте"""
+    return serialize_place_values(place.id, place.title, place.latitude, place.longitude)
+
+
+def serialize_place_values(place_id, title, latitude, longitude):
+    """Преобразует поля места в GeoJSON Feature, не требуя экземпляра модели"""
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [float(longitude), float(latitude)]
+        },
+        'properties': {
+            'title': title,
+            'placeId': str(place_id),
+            'detailsUrl': get_place_details_url(place_id)
+        }
+    }
+
+
+def serialize_search_result_feature(place, snippet):
+    """Преобразует найденное место в GeoJSON Feature с фрагментом текста, в котором нашлось совпадение"""
+    feature = serialize_place_feature(place)
+    feature['properties']['snippet'] = snippet
+    return feature
+
+
+def serialize_nearby_place_feature(place_values, distance):
+    """Преобразует найденное рядом место в GeoJSON Feature с расстоянием до него в метрах"""
+    feature = serialize_place_values(*place_values)
+    feature['properties']['distance'] = round(distance)
+    return feature
+
+
+def serialize_feature_collection(features):
+    """Собирает GeoJSON FeatureCollection из списка Feature"""
+    return {
+        'type': 'FeatureCollection',
+        'features': features
+    }
+
+
+def serialize_cluster_feature(cluster):
+    """Преобразует кластер меток в GeoJSON Feature; кластер из одного места отдаётся как место"""
+    if cluster.place:
+        return serialize_place_feature(cluster.place)
+
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': [cluster.longitude, cluster.latitude]
+        },
+        'properties': {
+            'clusterId': f'{cluster.zoom}/{cluster.cell_x}/{cluster.cell_y}',
+            'placesCount': cluster.places_count
+        }
+    }
+
+
+def serialize_image_srcset(image, variant_format):
+    """Собирает srcset из уменьшенных копий изображения в формате variant_format"""
+    storage = image.image.storage
+    return ', '.join(
+        f"{urllib.parse.unquote(storage.url(variant['name']))} {variant['width']}w"
+        for variant in image.get_variants(variant_format)
+    )
+
+
+def serialize_place_details(place):
+    """Преобразует место с предзагруженными изображениями в JSON с деталями места"""
+    images = [image for image in place.images.all() if image.image]
+
+    return {
+        'title': place.title,
+        'imgs': [urllib.parse.unquote(image.image.url) for image in images],
+        'images': [
+            {
+                'url': urllib.parse.unquote(image.image.url),
+                'srcset': {
+                    variant_format: serialize_image_srcset(image, variant_format)
+                    for variant_format in VARIANT_FORMATS
+                },
+                'width': image.width,
+                'height': image.height,
+                'size': image.file_size,
+                'color': image.dominant_color,
+                'placeholder': image.placeholder
+            }
+            for image in images
+        ],
+        'description_short': place.short_description,
+        'description_long': place.long_description,
+        'coordinates': {
+            'lng': str(place.longitude),
+            'lat': str(place.latitude)
+        }
+    }
+
+
+def dump_place_details(place):
+    """Сериализует детали места в байты JSON; с отступами только в режиме отладки"""
+    return json.dumps(
+        serialize_place_details(place),
+        ensure_ascii=False,
+        **_get_json_format_params()
+    ).encode('utf-8')
+
+
+def iter_places_geojson(place_rows):
+    """Генерирует байты GeoJSON FeatureCollection порциями около GEOJSON_STREAM_BUFFER_SIZE из строк (id, название, широта, долгота)"""
+    buffer = bytearray(GEOJSON_STREAM_HEADER)
+    separator = b''
+    for place_row in place_rows:
+        buffer += separator
+        buffer += _dump_place_row(place_row)
+        separator = b','
+        if len(buffer) >= GEOJSON_STREAM_BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += GEOJSON_STREAM_FOOTER
+    yield bytes(buffer)
+
+
+async def aiter_places_geojson(place_rows):
+    """Асинхронная версия iter_places_geojson для асинхронного итератора строк, например QuerySet.aiterator()"""
+    buffer = bytearray(GEOJSON_STREAM_HEADER)
+    separator = b''
+    async for place_row in place_rows:
+        buffer += separator
+        buffer += _dump_place_row(place_row)
+        separator = b','
+        if len(buffer) >= GEOJSON_STREAM_BUFFER_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+    buffer += GEOJSON_STREAM_FOOTER
+    yield bytes(buffer)
+
+
+def _dump_place_row(place_row):
+    return json.dumps(
+        serialize_place_values(*place_row),
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _get_json_format_params():
+    if settings.DEBUG:
+        return {'indent': 2}
+    return {'separators': (',', ':')}
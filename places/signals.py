@@ -0,0 +1,179 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .blobs import save_image_blob
+from .cache import bump_data_version, invalidate_place_details
+from .clusters import (
+    add_place_to_clusters,
+    move_place_in_clusters,
+    rebuild_clusters,
+    remove_place_from_clusters,
+)
+from .geo import get_nearby_cell
+from .models import Place, PlaceImage
+from .processing import schedule_image_processing
+from .search import index_places, unindex_place
+from .tiles import invalidate_tiles
+
+
+# Отправляется после Place.objects.bulk_create, при котором post_save не вызывается.
+# Аргументы: places - список созданных мест.
+places_bulk_created = Signal()
+
+
+@receiver(pre_save, sender=Place)
+def update_nearby_cell(sender, instance, **kwargs):
+    """Пересчитывает ячейку сетки поиска ближайших мест по координатам места"""
+    instance.nearby_cell = get_nearby_cell(instance.latitude, instance.longitude)
+
+
+@receiver(pre_save, sender=Place)
+def remember_previous_coordinates(sender, instance, raw=False, **kwargs):
+    """Запоминает координаты места до сохранения, чтобы обновить производные данные"""
+    instance._previous_coordinates = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_coordinates = Place.objects.filter(pk=instance.pk).values_list(
+        'latitude', 'longitude'
+    ).first()
+
+
+@receiver(post_save, sender=Place)
+def update_clusters_on_place_save(sender, instance, created, raw=False, **kwargs):
+    """Обновляет кластеры меток после создания или изменения места"""
+    if raw:
+        return
+
+    previous_coordinates = getattr(instance, '_previous_coordinates', None)
+    if created or previous_coordinates is None:
+        add_place_to_clusters(instance)
+        return
+
+    if _coordinates_changed(previous_coordinates, instance):
+        move_place_in_clusters(instance, *previous_coordinates)
+
+
+@receiver(post_delete, sender=Place)
+def update_clusters_on_place_delete(sender, instance, **kwargs):
+    """Удаляет место из кластеров меток после его удаления"""
+    remove_place_from_clusters(instance.id, instance.latitude, instance.longitude)
+
+
+@receiver(post_save, sender=Place)
+def update_search_index_on_place_save(sender, instance, raw=False, **kwargs):
+    """Обновляет место в полнотекстовом индексе после его создания или изменения"""
+    if raw:
+        return
+    index_places([instance])
+
+
+@receiver(post_delete, sender=Place)
+def update_search_index_on_place_delete(sender, instance, **kwargs):
+    """Удаляет место из полнотекстового индекса после его удаления"""
+    unindex_place(instance.id)
+
+
+# Регистрируется раньше сброса тайлов: get_tile сверяет версию, чтобы не сохранить тайл из старых данных
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def bump_data_version_on_place_change(sender, raw=False, **kwargs):
+    """Выпускает новую версию данных о местах после их изменения"""
+    if raw:
+        return
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(post_save, sender=Place)
+def invalidate_tiles_on_place_save(sender, instance, raw=False, **kwargs):
+    """Сбрасывает тайлы, в которые место попадало до и после сохранения"""
+    if raw:
+        return
+
+    touched_coordinates = {(instance.latitude, instance.longitude)}
+    previous_coordinates = getattr(instance, '_previous_coordinates', None)
+    if previous_coordinates:
+        touched_coordinates.add(previous_coordinates)
+
+    for latitude, longitude in touched_coordinates:
+        transaction.on_commit(partial(invalidate_tiles, latitude, longitude))
+
+
+@receiver(post_delete, sender=Place)
+def invalidate_tiles_on_place_delete(sender, instance, **kwargs):
+    """Сбрасывает тайлы, в которые попадало удалённое место"""
+    transaction.on_commit(partial(invalidate_tiles, instance.latitude, instance.longitude))
+
+
+@receiver(post_save, sender=Place)
+@receiver(post_delete, sender=Place)
+def invalidate_details_on_place_change(sender, instance, raw=False, **kwargs):
+    """Сбрасывает закэшированный JSON с деталями изменённого места"""
+    if raw:
+        return
+    transaction.on_commit(partial(invalidate_place_details, instance.id))
+
+
+@receiver(post_save, sender=PlaceImage)
+@receiver(post_delete, sender=PlaceImage)
+def invalidate_details_on_image_change(sender, instance, raw=False, **kwargs):
+    """Сбрасывает закэшированный JSON с деталями места после изменения или перестановки его изображений"""
+    if raw:
+        return
+    transaction.on_commit(partial(invalidate_place_details, instance.place_id))
+
+
+@receiver(pre_save, sender=PlaceImage)
+def store_uploaded_image_by_content(sender, instance, raw=False, **kwargs):
+    """Сохраняет загруженный через админку файл по адресу из SHA-256, переиспользуя уже сохранённый"""
+    if raw or not instance.image or instance.image._committed:
+        return
+    instance.image, instance.content_hash = save_image_blob(instance.image.file, instance.image.name)
+
+
+@receiver(pre_save, sender=PlaceImage)
+def remember_image_change(sender, instance, raw=False, **kwargs):
+    """Отмечает, что файл изображения заменён и его метаданные и уменьшенные копии устарели"""
+    instance._image_changed = False
+    if raw or instance.pk is None:
+        return
+    previous_name = PlaceImage.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+    instance._image_changed = previous_name != instance.image.name
+
+
+@receiver(post_save, sender=PlaceImage)
+def process_image_on_save(sender, instance, created, raw=False, **kwargs):
+    """Рассчитывает метаданные и уменьшенные копии нового или заменённого изображения после фиксации транзакции"""
+    if raw:
+        return
+    if (
+        created
+        or not instance.variants
+        or instance.width is None
+        or getattr(instance, '_image_changed', False)
+    ):
+        schedule_image_processing(instance.id)
+
+
+@receiver(places_bulk_created, sender=Place)
+def update_derived_data_on_bulk_create(sender, places, **kwargs):
+    """Обновляет полнотекстовый индекс, кластеры, тайлы и версию данных после пакетного создания мест"""
+    index_places(places)
+
+    def update_derived_data():
+        rebuild_clusters()
+        bump_data_version()
+        for place in places:
+            invalidate_tiles(place.latitude, place.longitude)
+
+    transaction.on_commit(update_derived_data)
+
+
+def _coordinates_changed(previous_coordinates, place):
+    old_latitude, old_longitude = previous_coordinates
+    return (
+        float(old_latitude) != float(place.latitude)
+        or float(old_longitude) != float(place.longitude)
+    )
@@ -0,0 +1,112 @@
+import contextlib
+import functools
+import io
+import json
+import os
+import random
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+
+SYNTHETIC_IMAGE_SIZE = (1600, 1067)
+
+SYNTHETIC_IMAGE_QUALITY = 85
+
+PLACES_DIR = 'places'
+IMAGES_DIR = 'images'
+
+WORDS = (
+    'парк', 'музей', 'усадьба', 'набережная', 'смотровая', 'площадка', 'храм', 'мост',
+    'сад', 'галерея', 'театр', 'фонтан', 'аллея', 'крепость', 'маяк', 'озеро', 'остров',
+    'старинный', 'тихий', 'исторический', 'зелёный', 'городской', 'знаменитый', 'уютный',
+)
+
+
+def render_synthetic_image(seed, size=SYNTHETIC_IMAGE_SIZE):
+    """Рисует детерминированное JPEG-изображение с градиентом и фигурами, похожее по весу на фотографию"""
+    randomizer = random.Random(seed)
+    width, height = size
+    top_color = [randomizer.randrange(256) for _ in range(3)]
+    bottom_color = [randomizer.randrange(256) for _ in range(3)]
+
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.composite(
+        Image.new('RGB', size, tuple(bottom_color)),
+        Image.new('RGB', size, tuple(top_color)),
+        gradient
+    )
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = randomizer.randrange(width), randomizer.randrange(height)
+        radius = randomizer.randrange(10, max(11, width // 6))
+        color = tuple(randomizer.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=SYNTHETIC_IMAGE_QUALITY)
+    return output.getvalue()
+
+
+def generate_raw_place(number, image_urls, randomizer):
+    """Возвращает данные места в формате JSON, который принимают load_place и load_all_places"""
+    title_words = randomizer.sample(WORDS, 3)
+    description = ' '.join(randomizer.choice(WORDS) for _ in range(60))
+    return {
+        'title': f'{" ".join(title_words).capitalize()} №{number}',
+        'imgs': image_urls,
+        'description_short': ' '.join(randomizer.choice(WORDS) for _ in range(15)).capitalize() + '.',
+        'description_long': f'<p>{description.capitalize()}.</p><p>{description}.</p>',
+        'coordinates': {
+            'lng': str(round(randomizer.uniform(37.3, 37.9), 14)),
+            'lat': str(round(randomizer.uniform(55.55, 55.95), 14))
+        }
+    }
+
+
+def write_dataset(directory, places_count, images_per_place, base_url, image_size=SYNTHETIC_IMAGE_SIZE, seed=0):
+    """Записывает JSON мест в places/ и изображения в images/ со ссылками от base_url и возвращает пути к JSON файлам"""
+    randomizer = random.Random(seed)
+    places_dir = os.path.join(directory, PLACES_DIR)
+    images_dir = os.path.join(directory, IMAGES_DIR)
+    os.makedirs(places_dir, exist_ok=True)
+    os.makedirs(images_dir, exist_ok=True)
+
+    json_paths = []
+    for number in range(1, places_count + 1):
+        image_urls = []
+        for image_number in range(1, images_per_place + 1):
+            filename = f'{number:06d}_{image_number}.jpg'
+            with open(os.path.join(images_dir, filename), 'wb') as f:
+                f.write(render_synthetic_image(f'{seed}:{number}:{image_number}', image_size))
+            image_urls.append(f'{base_url.rstrip("/")}/{IMAGES_DIR}/{filename}')
+
+        json_path = os.path.join(places_dir, f'{number:06d}.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(generate_raw_place(number, image_urls, randomizer), f, ensure_ascii=False, indent=2)
+        json_paths.append(json_path)
+
+    return json_paths
+
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Раздает файлы, не печатая каждый запрос в stderr"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_directory(directory, host='127.0.0.1', port=0):
+    """Раздает папку по HTTP в фоновом потоке и возвращает базовый URL сервера"""
+    handler = functools.partial(QuietHTTPRequestHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1 +1,997 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import warnings
+from contextlib import redirect_stdout
+from unittest import mock, skipIf
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection, transaction
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from . import metrics, views
+from .cache import (
+    PAYLOAD_FORMAT_VERSION,
+    get_place_details_payload,
+    invalidate_place_details,
+    invalidate_places_details,
+)
+from .clusters import build_clusters
+from .compression import brotli
+from .geo import get_distance, get_grid_cell, get_grid_ranges, parse_bbox
+from .models import Place, PlaceCluster, PlaceImage
+from .registry import PlacesSnapshot, get_places_snapshot
+from .search import strip_html
+from .serializers import dump_place_details
+from .synthetic import IMAGES_DIR, serve_directory, write_dataset
+from .tiles import get_tile_path
+
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'places_state': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests_state'},
+}
+
+
+class IsolatedStorageMixin:
+    """Переключает медиафайлы, тайлы и кэши на временные хранилища на время теста"""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, 'media'),
+            PLACES_TILES_ROOT=os.path.join(self.directory, 'tiles'),
+            CACHES=TEST_CACHES,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Кэши в памяти переживают тест, а ID мест после отката транзакции повторяются
+        for alias in TEST_CACHES:
+            caches[alias].clear()
+
+    def create_place(self, title, latitude, longitude, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Place.objects.create(title=title, latitude=latitude, longitude=longitude, **fields)
+
+    def save_place(self, place):
+        with self.captureOnCommitCallbacks(execute=True):
+            place.save()
+
+
+def make_image_file(name, size=(640, 480), color=(200, 30, 30)):
+    content = io.BytesIO()
+    Image.new('RGB', size, color).save(content, format='JPEG')
+    return ContentFile(content.getvalue(), name=name)
+
+
+class VersionedResponsesTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.place = self.create_place('Место', '55.75', '37.61')
+
+    def test_geojson_revalidation_returns_304_until_data_changes(self):
+        url = reverse('places_geojson')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 1)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.create_place('Второе место', '55.76', '37.62')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['features']), 2)
+
+    def test_compressed_geojson_revalidation(self):
+        for number in range(5):
+            self.create_place(f'Место {number}', '55.7', f'37.{number}')
+        url = reverse('places_geojson')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_payload_format_change_invalidates_etag(self):
+        url = reverse('place_clusters')
+        params = {'bbox': '37,55,38,56', 'zoom': '5'}
+        etag = self.client.get(url, params)['ETag']
+
+        with mock.patch('places.cache.PAYLOAD_FORMAT_VERSION', PAYLOAD_FORMAT_VERSION + 1):
+            response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PlaceDetailsCacheTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.place = self.create_place('Место', '55.75', '37.61', short_description='Коротко')
+        self.url = reverse('place_details', kwargs={'place_id': self.place.id})
+
+    def test_revalidation_returns_304_until_place_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Место')
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.place.title = 'Переименованное место'
+        self.save_place(self.place)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Переименованное место')
+
+    def test_cached_payload_is_served_without_queries(self):
+        get_place_details_payload(self.place.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_invalidation_deletes_old_payload(self):
+        get_place_details_payload(self.place.id)
+        entries_count = len(cache._cache)
+
+        invalidate_place_details(self.place.id)
+
+        self.assertEqual(len(cache._cache), entries_count - 1)
+
+    def test_payload_built_during_invalidation_is_not_served(self):
+        # Место меняется, пока его детали собираются из старых данных
+        def dump_and_change_place(place):
+            content = dump_place_details(place)
+            Place.objects.filter(id=place.id).update(title='Новое название')
+            invalidate_place_details(place.id)
+            return content
+
+        with mock.patch('places.cache.dump_place_details', side_effect=dump_and_change_place):
+            stale_payload = get_place_details_payload(self.place.id)
+
+        payload = get_place_details_payload(self.place.id)
+
+        self.assertIn('Место'.encode('utf-8'), stale_payload['content'])
+        self.assertIn('Новое название'.encode('utf-8'), payload['content'])
+
+    def test_bulk_invalidation_resets_every_place(self):
+        places = [self.place] + [
+            self.create_place(f'Место {number}', '55.75', '37.61') for number in range(25)
+        ]
+        old_payloads = {place.id: get_place_details_payload(place.id) for place in places}
+        Place.objects.update(short_description='Изменено')
+
+        invalidate_places_details([place.id for place in places])
+
+        for place in places:
+            payload = get_place_details_payload(place.id)
+            self.assertNotEqual(payload['etag'], old_payloads[place.id]['etag'])
+
+    def test_missing_place_returns_404(self):
+        response = self.client.get(reverse('place_details', kwargs={'place_id': self.place.id + 1}))
+        self.assertEqual(response.status_code, 404)
+
+
+class ExportPlacesTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.output_dir = os.path.join(self.directory, 'export')
+        self.places = [
+            self.create_place(f'Место {number}', '55.7', f'37.{number}', long_description='Описание ' * 50)
+            for number in range(3)
+        ]
+
+    def export(self, *args):
+        stdout = io.StringIO()
+        call_command('export_places', self.output_dir, *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def read_file(self, path):
+        with open(os.path.join(self.output_dir, path), 'rb') as f:
+            return f.read()
+
+    def test_files_match_responses(self):
+        self.export()
+
+        self.assertEqual(self.read_file('places.geojson'), self.client.get(reverse('places_geojson')).content)
+        for place in self.places:
+            response = self.client.get(reverse('place_details', kwargs={'place_id': place.id}))
+            self.assertEqual(self.read_file(os.path.join('places', f'{place.id}.json')), response.content)
+
+        with open(os.path.join(self.output_dir, 'manifest.json'), encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)), len(self.places) + 1)
+
+    def test_export_does_not_fill_response_cache(self):
+        self.export()
+        self.assertEqual(len(cache._cache), 0)
+
+    def test_repeated_export_writes_only_changes(self):
+        self.export()
+        self.assertIn('Файлов записано: 0', self.export())
+
+        self.places[0].title = 'Переименованное место'
+        self.save_place(self.places[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.places[1].delete()
+
+        output = self.export()
+
+        # Изменились GeoJSON и детали переименованного места, файл удалённого места удален
+        self.assertIn('Файлов записано: 2', output)
+        self.assertIn('Файлов удалено: 1', output)
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'places', f'{self.places[1].id}.json')))
+
+    def test_compressed_copies(self):
+        self.export('--compress')
+
+        path = os.path.join('places', f'{self.places[0].id}.json')
+        self.assertEqual(gzip.decompress(self.read_file(f'{path}.gz')), self.read_file(path))
+
+
+class PlaceAdminTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(
+            get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        )
+        for number in range(30):
+            self.create_place(f'Место {number:02d}', '55.7', '37.6')
+
+    def test_changelist_counts_images_without_per_row_queries(self):
+        place = Place.objects.get(title='Место 00')
+        for order in range(3):
+            PlaceImage.objects.bulk_create([PlaceImage(place=place, order=order, image=f'places/{order}.jpg')])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:places_place_changelist'))
+
+        self.assertContains(response, '3 изображений')
+        self.assertLess(len(queries), 10)
+
+    def test_autocomplete_is_ordered(self):
+        url = reverse('admin:autocomplete')
+        params = {'app_label': 'places', 'model_name': 'placeimage', 'field_name': 'place'}
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            first_page = self.client.get(url, {**params, 'page': 1}).json()
+            second_page = self.client.get(url, {**params, 'page': 2}).json()
+
+        titles = [result['text'] for result in first_page['results'] + second_page['results']]
+        self.assertEqual(titles, [f'Место {number:02d}' for number in range(30)])
+
+
+class ImageProcessingTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.place = self.create_place('Место', '55.75', '37.61')
+
+    def get_details(self):
+        return self.client.get(reverse('place_details', kwargs={'place_id': self.place.id})).json()
+
+    @override_settings(PLACES_IMAGE_VARIANTS_WORKERS=4)
+    def test_saved_images_are_processed_after_commit_without_pool(self):
+        with mock.patch('places.processing.ProcessPoolExecutor') as executor:
+            with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+                for order, color in enumerate([(200, 30, 30), (30, 200, 30)]):
+                    PlaceImage.objects.create(
+                        place=self.place, order=order, image=make_image_file(f'{order}.jpg', color=color)
+                    )
+                self.assertEqual(PlaceImage.objects.exclude(variants=[]).count(), 0)
+
+        executor.assert_not_called()
+        for image in PlaceImage.objects.all():
+            self.assertEqual(
+                sorted((variant['width'], variant['format']) for variant in image.variants),
+                [(300, 'jpeg'), (300, 'webp'), (600, 'jpeg'), (600, 'webp')]
+            )
+            for variant in image.variants:
+                self.assertTrue(image.image.storage.exists(variant['name']))
+
+        srcset = self.get_details()['images'][0]['srcset']
+        self.assertRegex(srcset['webp'], r'^\S+_300\.webp 300w, \S+_600\.webp 600w$')
+        self.assertRegex(srcset['jpeg'], r'^\S+_300\.jpg 300w, \S+_600\.jpg 600w$')
+
+    def test_backfill_command_processes_images_in_pool(self):
+        PlaceImage.objects.bulk_create([
+            PlaceImage(
+                place=self.place,
+                order=order,
+                image=default_storage.save(f'places/{order}.jpg', make_image_file(f'{order}.jpg', size=(200, 100)))
+            )
+            for order in range(3)
+        ])
+
+        call_command('process_place_images', '--workers', '2', stdout=io.StringIO())
+
+        for image in PlaceImage.objects.all():
+            self.assertEqual(
+                [(variant['width'], variant['format']) for variant in image.variants],
+                [(200, 'webp'), (200, 'jpeg')]
+            )
+        self.assertIn('_200.webp 200w', self.get_details()['images'][2]['srcset']['webp'])
+
+    def test_metadata_is_exposed_in_details(self):
+        image_file = make_image_file('image.jpg', size=(320, 200), color=(0, 0, 255))
+        with self.captureOnCommitCallbacks(execute=True):
+            PlaceImage.objects.create(place=self.place, image=image_file)
+
+        image = self.get_details()['images'][0]
+
+        self.assertEqual((image['width'], image['height']), (320, 200))
+        self.assertEqual(image['size'], image_file.size)
+        red, green, blue = (int(image['color'][i:i + 2], 16) for i in (1, 3, 5))
+        self.assertLess(red + green, 20)
+        self.assertGreater(blue, 235)
+        self.assertTrue(image['placeholder'].startswith('data:image/webp;base64,'))
+        placeholder = Image.open(io.BytesIO(base64.b64decode(image['placeholder'].split(',', 1)[1])))
+        self.assertEqual(placeholder.size, (16, 10))
+
+
+class ServerInterfaceViewsTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.places = [
+            self.create_place(f'Место {number}', '55.7', f'37.{number}', short_description='Коротко')
+            for number in range(5)
+        ]
+
+    def test_wsgi_serves_sync_views(self):
+        self.assertFalse(settings.ASGI)
+        response = self.client.get(reverse('main'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('main'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertIs(response.resolver_match.func, views.get_places_map)
+
+    async def test_async_views_match_sync_views(self):
+        request_factory = AsyncRequestFactory()
+        for sync_view, async_view, kwargs in [
+            (views.get_places_map, views.aget_places_map, {}),
+            (views.get_place_details_json, views.aget_place_details_json, {'place_id': self.places[0].id}),
+        ]:
+            sync_response = await sync_to_async(sync_view)(request_factory.get('/'), **kwargs)
+            async_response = await async_view(request_factory.get('/'), **kwargs)
+            self.assertEqual(async_response.content, sync_response.content)
+            self.assertEqual(async_response['ETag'], sync_response['ETag'])
+
+            async_response = await async_view(
+                request_factory.get('/', headers={'If-None-Match': sync_response['ETag']}), **kwargs
+            )
+            self.assertEqual(async_response.status_code, 304)
+
+    async def test_async_details_of_missing_place(self):
+        with self.assertRaises(Http404):
+            await views.aget_place_details_json(AsyncRequestFactory().get('/'), place_id=self.places[-1].id + 1)
+
+    def test_streaming_export_under_wsgi(self):
+        response = self.client.get(reverse('places_export'))
+
+        self.assertFalse(response.is_async)
+        features = json.loads(b''.join(response.streaming_content))['features']
+        self.assertEqual([feature['properties']['title'] for feature in features],
+                         [place.title for place in self.places])
+
+    async def test_streaming_export_under_asgi(self):
+        response = await self.async_client.get(reverse('places_export'))
+
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        features = json.loads(content)['features']
+        self.assertEqual([feature['properties']['title'] for feature in features],
+                         [place.title for place in self.places])
+
+
+@override_settings(
+    METRICS_ENABLED=True,
+    METRICS_TOKEN='secret-token',
+    MIDDLEWARE=['places.middleware.RequestMetricsMiddleware', *settings.MIDDLEWARE],
+)
+class MetricsTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry._views.clear()
+
+    def get_metrics(self, token='secret-token'):
+        return self.client.get(reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_metric(self, name, view):
+        for line in self.get_metrics().content.decode().splitlines():
+            if line.startswith(f'where_to_go_{name}{{view="{view}",method="GET"}} '):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_metrics_require_bearer_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        self.assertEqual(self.get_metrics('wrong-token').status_code, 404)
+
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'where_to_go_request_duration_seconds', response.content)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_are_disabled_without_token(self):
+        self.assertEqual(self.get_metrics('').status_code, 404)
+
+    def test_streaming_response_is_observed_after_body(self):
+        for number in range(3):
+            self.create_place(f'Место {number}', '55.7', '37.6')
+
+        response = self.client.get(reverse('places_export'))
+        content = b''.join(response.streaming_content)
+
+        self.assertEqual(self.get_metric('response_size_bytes_total', 'places_export'), len(content))
+        self.assertGreater(self.get_metric('db_queries_total', 'places_export'), 0)
+        self.assertEqual(len(json.loads(content)['features']), 3)
+
+    def test_regular_response_is_observed(self):
+        response = self.client.get(reverse('places_geojson'))
+
+        self.assertEqual(self.get_metric('response_size_bytes_total', 'places_geojson'), len(response.content))
+
+
+
+class ParseBboxTests(TestCase):
+
+    def test_bbox_across_antimeridian(self):
+        west, south, east, north = parse_bbox('170,-10,190,10')
+        self.assertEqual((west, south, east, north), (170.0, -10.0, -170.0, 10.0))
+
+        x_ranges, _ = get_grid_ranges((west, south, east, north), 16)
+        self.assertEqual(x_ranges, [(15, 15), (0, 0)])
+
+    def test_negative_west_across_antimeridian(self):
+        self.assertEqual(parse_bbox('-190,-10,-170,10'), (170.0, -10.0, -170.0, 10.0))
+
+    def test_whole_world(self):
+        self.assertEqual(parse_bbox('-200,-100,200,100'), (-180.0, -90.0, 180.0, 90.0))
+
+    def test_invalid_bbox(self):
+        for raw_bbox in ('1,2,3', '1,2,3,north', '0,10,10,0'):
+            with self.subTest(bbox=raw_bbox), self.assertRaises(ValueError):
+                parse_bbox(raw_bbox)
+
+
+class PlacesInBboxTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_place('Москва', '55.75', '37.61')
+        self.create_place('Санкт-Петербург', '59.93', '30.31')
+        self.create_place('Голуэй', '53.27', '-9.05')
+
+    def get_titles(self, bbox):
+        response = self.client.get(reverse('places_geojson'), {'bbox': bbox})
+        self.assertEqual(response.status_code, 200)
+        return sorted(feature['properties']['title'] for feature in response.json()['features'])
+
+    def test_only_places_in_bbox_are_returned(self):
+        self.assertEqual(self.get_titles('37,55,38,56'), ['Москва'])
+        self.assertEqual(self.get_titles('30,55,38,60'), ['Москва', 'Санкт-Петербург'])
+        self.assertEqual(self.get_titles('0,0,1,1'), [])
+
+    def test_bbox_longitudes_are_wrapped(self):
+        self.assertEqual(self.get_titles('350,53,400,56'), ['Голуэй', 'Москва'])
+
+    def test_invalid_bbox_returns_400(self):
+        response = self.client.get(reverse('places_geojson'), {'bbox': '0,10,10,0'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class ClustersTests(IsolatedStorageMixin, TestCase):
+    """Кластеры, обновляемые по одному месту, совпадают с полным пересчетом"""
+
+    def assertClustersMatchRebuild(self):
+        expected = build_clusters(Place.objects.values_list('id', 'latitude', 'longitude'))
+        actual = {
+            (cluster.zoom, cluster.cell_x, cluster.cell_y): cluster
+            for cluster in PlaceCluster.objects.all()
+        }
+        self.assertEqual(set(actual), set(expected))
+        for key, cluster in actual.items():
+            with self.subTest(cell=key):
+                self.assertEqual(cluster.places_count, expected[key]['places_count'])
+                self.assertAlmostEqual(cluster.latitude_sum, expected[key]['latitude_sum'], places=9)
+                self.assertAlmostEqual(cluster.longitude_sum, expected[key]['longitude_sum'], places=9)
+                self.assertEqual(cluster.place_id, expected[key]['place_id'])
+
+    def delete_place(self, place):
+        with self.captureOnCommitCallbacks(execute=True):
+            place.delete()
+
+    def test_add_place(self):
+        self.create_place('Первое', '55.75', '37.61')
+        self.assertClustersMatchRebuild()
+
+        self.create_place('Второе', '55.7501', '37.6101')
+        self.create_place('Третье', '-33.92', '18.42')
+        self.assertClustersMatchRebuild()
+
+    def test_move_place(self):
+        place = self.create_place('Первое', '55.75', '37.61')
+        self.create_place('Второе', '55.7501', '37.6101')
+
+        # Сдвиг внутри ячеек крупных масштабов и переход в другие ячейки мелких
+        place.latitude, place.longitude = '55.76', '37.62'
+        self.save_place(place)
+        self.assertClustersMatchRebuild()
+
+        place.latitude, place.longitude = '-33.92', '18.42'
+        self.save_place(place)
+        self.assertClustersMatchRebuild()
+
+    def test_remove_place(self):
+        first = self.create_place('Первое', '55.75', '37.61')
+        self.create_place('Второе', '55.7501', '37.6101')
+        third = self.create_place('Третье', '55.76', '37.62')
+
+        self.delete_place(first)
+        self.assertClustersMatchRebuild()
+
+        self.delete_place(third)
+        self.assertClustersMatchRebuild()
+
+    def test_clusters_endpoint(self):
+        for number in range(3):
+            self.create_place(f'Москва {number}', '55.75', f'37.6{number}')
+        self.create_place('Кейптаун', '-33.92', '18.42')
+        url = reverse('place_clusters')
+
+        features = self.client.get(url, {'bbox': '-180,-85,180,85', 'zoom': '3'}).json()['features']
+        counts = sorted(feature['properties'].get('placesCount', 1) for feature in features)
+        self.assertEqual(counts, [1, 3])
+
+        features = self.client.get(url, {'bbox': '37,55,38,56', 'zoom': '17'}).json()['features']
+        self.assertEqual(len(features), 3)
+        self.assertTrue(all('placeId' in feature['properties'] for feature in features))
+
+        self.assertEqual(self.client.get(url, {'bbox': '37,55,38,56', 'zoom': '-1'}).status_code, 400)
+
+
+class TilesTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.place = self.create_place('Москва', '55.75', '37.61')
+        self.create_place('Кейптаун', '-33.92', '18.42')
+
+    def get_tile(self, zoom, latitude, longitude):
+        tile_x, tile_y = get_grid_cell(latitude, longitude, 2 ** zoom)
+        response = self.client.get(
+            reverse('places_tile', kwargs={'zoom': zoom, 'tile_x': tile_x, 'tile_y': tile_y})
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, get_tile_path(zoom, tile_x, tile_y)
+
+    def get_titles(self, response):
+        return [feature['properties']['title'] for feature in json.loads(response.content)['features']]
+
+    def test_tile_is_cached_on_disk(self):
+        response, path = self.get_tile(10, 55.75, 37.61)
+
+        self.assertEqual(self.get_titles(response), ['Москва'])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), response.content)
+        self.assertEqual(
+            self.client.get(response.wsgi_request.path, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304
+        )
+
+    def test_place_change_invalidates_only_touched_tiles(self):
+        _, old_tile_path = self.get_tile(10, 55.75, 37.61)
+        _, new_tile_path = self.get_tile(10, 59.93, 30.31)
+        _, other_tile_path = self.get_tile(10, -33.92, 18.42)
+
+        self.place.latitude, self.place.longitude = '59.93', '30.31'
+        self.save_place(self.place)
+
+        self.assertFalse(os.path.exists(old_tile_path))
+        self.assertFalse(os.path.exists(new_tile_path))
+        self.assertTrue(os.path.exists(other_tile_path))
+        self.assertEqual(self.get_titles(self.get_tile(10, 55.75, 37.61)[0]), [])
+        self.assertEqual(self.get_titles(self.get_tile(10, 59.93, 30.31)[0]), ['Москва'])
+
+    def test_invalid_tile_returns_404(self):
+        response = self.client.get(reverse('places_tile', kwargs={'zoom': 2, 'tile_x': 4, 'tile_y': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+class PlacesDetailsBatchTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.places = [
+            self.create_place(f'Место {number}', '55.7', f'37.{number}', short_description='Коротко')
+            for number in range(3)
+        ]
+        self.url = reverse('places_details')
+
+    def test_batch_matches_single_details(self):
+        place_ids = [place.id for place in self.places]
+        missing_id = place_ids[-1] + 1
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'ids': ','.join(map(str, [*place_ids, missing_id]))})
+
+        details = response.json()
+        self.assertEqual(list(details), [str(place_id) for place_id in place_ids])
+        for place_id in place_ids:
+            single_response = self.client.get(reverse('place_details', kwargs={'place_id': place_id}))
+            self.assertEqual(details[str(place_id)], single_response.json())
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'ids': ','.join(map(str, place_ids))})
+
+    @override_settings(PLACES_DETAILS_BATCH_LIMIT=2)
+    def test_batch_limit(self):
+        response = self.client.get(self.url, {'ids': ','.join(str(place.id) for place in self.places)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_ids(self):
+        self.assertEqual(self.client.get(self.url, {'ids': '1,a'}).status_code, 400)
+
+
+@override_settings(PLACES_IMAGE_VARIANTS_WORKERS=1)
+class LoadPlaceImagesTests(IsolatedStorageMixin, TestCase):
+    """Синхронизация изображений места при повторной загрузке с --force"""
+
+    def setUp(self):
+        super().setUp()
+        self.dataset_dir = os.path.join(self.directory, 'dataset')
+        server = serve_directory(self.dataset_dir)
+        self.base_url = server.__enter__()
+        self.addCleanup(server.__exit__, None, None, None)
+
+        self.json_path = write_dataset(self.dataset_dir, 1, 3, self.base_url, image_size=(64, 48))[0]
+        with open(self.json_path, encoding='utf-8') as f:
+            self.raw_place = json.load(f)
+        self.image_urls = list(self.raw_place['imgs'])
+
+    def load_place(self, image_urls, force=True):
+        self.raw_place['imgs'] = image_urls
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.raw_place, f, ensure_ascii=False)
+
+        args = [self.json_path, '--retries', '0']
+        if force:
+            args.append('--force')
+        with redirect_stdout(io.StringIO()), self.captureOnCommitCallbacks(execute=True):
+            call_command('load_place', *args, stdout=io.StringIO())
+
+    def get_images(self):
+        place = Place.objects.get(title=self.raw_place['title'])
+        return list(place.images.order_by('order').values_list('id', 'order', 'source_url'))
+
+    def test_reorder_keeps_images(self):
+        self.load_place(self.image_urls, force=False)
+        images = self.get_images()
+
+        self.load_place(self.image_urls[::-1])
+
+        self.assertEqual(
+            self.get_images(),
+            [(image_id, order, url) for order, (image_id, _, url) in enumerate(images[::-1])]
+        )
+
+    def test_removed_url_deletes_image(self):
+        self.load_place(self.image_urls, force=False)
+        removed_image = PlaceImage.objects.get(source_url=self.image_urls[1])
+
+        self.load_place([self.image_urls[0], self.image_urls[2]])
+
+        self.assertEqual([url for _, _, url in self.get_images()], [self.image_urls[0], self.image_urls[2]])
+        self.assertFalse(PlaceImage.objects.filter(id=removed_image.id).exists())
+
+    def test_moved_url_with_same_content_reuses_image(self):
+        self.load_place(self.image_urls, force=False)
+        moved_image = PlaceImage.objects.get(source_url=self.image_urls[2])
+
+        images_dir = os.path.join(self.dataset_dir, IMAGES_DIR)
+        moved_filename = os.path.basename(self.image_urls[2])
+        shutil.copy(os.path.join(images_dir, moved_filename), os.path.join(images_dir, f'moved_{moved_filename}'))
+        moved_url = f'{self.base_url}/{IMAGES_DIR}/moved_{moved_filename}'
+
+        self.load_place([self.image_urls[0], self.image_urls[1], moved_url])
+
+        moved_image.refresh_from_db()
+        self.assertEqual(moved_image.source_url, moved_url)
+        self.assertEqual(moved_image.order, 2)
+        self.assertEqual(PlaceImage.objects.count(), 3)
+
+    def test_failed_image_is_retried_with_force(self):
+        images_dir = os.path.join(self.dataset_dir, IMAGES_DIR)
+        missing_path = os.path.join(images_dir, os.path.basename(self.image_urls[1]))
+        hidden_path = f'{missing_path}.hidden'
+        os.rename(missing_path, hidden_path)
+
+        with self.assertRaisesMessage(CommandError, 'Не удалось загрузить изображений: 1'):
+            self.load_place(self.image_urls, force=False)
+
+        place = Place.objects.get(title=self.raw_place['title'])
+        self.assertEqual(place.source_hash, '')
+        self.assertEqual([url for _, _, url in self.get_images()], [self.image_urls[0], self.image_urls[2]])
+
+        os.rename(hidden_path, missing_path)
+        self.load_place(self.image_urls)
+
+        place.refresh_from_db()
+        self.assertNotEqual(place.source_hash, '')
+        self.assertEqual([url for _, _, url in self.get_images()], self.image_urls)
+        self.assertEqual([order for _, order, _ in self.get_images()], [0, 1, 2])
+
+
+class SearchTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.places = [
+            self.create_place(
+                'Музей космонавтики', '55.82', '37.64', long_description='<p>Ракеты и <strong>спутники</strong></p>'
+            ),
+            self.create_place('Парк Горького', '55.73', '37.60', short_description='Набережная и музей под открытым небом'),
+            self.create_place('Планетарий', '55.76', '37.58', long_description='Звёзды, ракеты &amp; телескопы'),
+            self.create_place('Зарядье', '55.75', '37.63', short_description='Парк у Кремля'),
+        ]
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('places_search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [feature['properties']['title'] for feature in response.json()['features']]
+
+    def brute_force_search(self, query):
+        query_words = re.findall(r'\w+', query.lower())
+        titles = set()
+        for place in Place.objects.all():
+            text = ' '.join([place.title, strip_html(place.short_description), strip_html(place.long_description)])
+            words = re.findall(r'\w+', text.lower())
+            if all(any(word.startswith(query_word) for word in words) for query_word in query_words):
+                titles.add(place.title)
+        return titles
+
+    def test_results_match_brute_force(self):
+        for query in ['музей', 'парк', 'ракеты', 'ракеты звёзды', 'телескоп', 'кремль', 'strong', 'amp']:
+            with self.subTest(query=query):
+                self.assertEqual(set(self.search(query)), self.brute_force_search(query))
+
+    def test_prefix_query(self):
+        self.assertEqual(set(self.search('муз')), {'Музей космонавтики', 'Парк Горького'})
+        self.assertEqual(self.search('пла'), ['Планетарий'])
+
+    def test_title_match_ranks_first(self):
+        self.assertEqual(self.search('музей'), ['Музей космонавтики', 'Парк Горького'])
+        self.assertEqual(self.search('парк'), ['Парк Горького', 'Зарядье'])
+        self.assertEqual(self.search('парк', limit=1), ['Парк Горького'])
+
+    def test_index_follows_changes(self):
+        self.places[2].title = 'Обсерватория'
+        self.save_place(self.places[2])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.places[0].delete()
+
+        self.assertEqual(self.search('обсерв'), ['Обсерватория'])
+        self.assertEqual(self.search('планетарий'), [])
+        self.assertEqual(self.search('ракеты'), ['Обсерватория'])
+
+    def test_invalid_queries(self):
+        self.assertEqual(self.client.get(reverse('places_search'), {'q': ' '}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('places_search'), {'q': 'парк', 'limit': '0'}).status_code, 400)
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(
+            get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:places_place_changelist'), {'q': 'муз'})
+
+        self.assertEqual(
+            {place.title for place in response.context['cl'].result_list},
+            {'Музей космонавтики', 'Парк Горького'}
+        )
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+
+
+class CompressionTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.place = self.create_place('Место', '55.75', '37.61', long_description='Описание места ' * 50)
+        self.url = reverse('place_details', kwargs={'place_id': self.place.id})
+        self.content = self.client.get(self.url).content
+
+    def get(self, accept_encoding):
+        return self.client.get(self.url, HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    @skipIf(brotli is None, 'brotli не установлен')
+    def test_brotli_is_preferred(self):
+        response = self.get('gzip, deflate, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+    def test_gzip(self):
+        for accept_encoding in ['gzip', 'gzip, br;q=0', 'GZIP;q=0.5, identity']:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(accept_encoding)
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertEqual(gzip.decompress(response.content), self.content)
+
+    def test_identity(self):
+        for accept_encoding in ['', 'identity', 'gzip;q=0, br;q=0.0', 'deflate']:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.get(accept_encoding)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(response.content, self.content)
+
+    def test_compressed_bytes_are_reused(self):
+        self.get('gzip')
+        with mock.patch('places.compression.gzip.compress') as compress:
+            response = self.get('gzip')
+
+        compress.assert_not_called()
+        self.assertEqual(gzip.decompress(response.content), self.content)
+
+
+class StreamingExportTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(20):
+            self.create_place(f'Место {number}', '55.7', f'37.{number:02d}')
+
+    @override_settings(PLACES_EXPORT_CHUNK_SIZE=5)
+    @mock.patch('places.serializers.GEOJSON_STREAM_BUFFER_SIZE', 512)
+    def test_export_matches_geojson_in_chunks(self):
+        response = self.client.get(reverse('places_export'))
+
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        self.assertIn('attachment', response['Content-Disposition'])
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)
+        features = json.loads(b''.join(chunks))['features']
+        expected_features = self.client.get(reverse('places_geojson')).json()['features']
+        self.assertEqual(
+            sorted(features, key=lambda feature: feature['properties']['placeId']),
+            sorted(expected_features, key=lambda feature: feature['properties']['placeId'])
+        )
+
+    def test_export_revalidation(self):
+        response = self.client.get(reverse('places_export'))
+        b''.join(response.streaming_content)
+
+        response = self.client.get(reverse('places_export'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class PlacesSnapshotTests(IsolatedStorageMixin, TestCase):
+
+    def test_bbox_matches_brute_force(self):
+        randomizer = random.Random(19)
+        place_rows = [
+            (place_id, f'Место {place_id}', randomizer.uniform(-85, 85), randomizer.uniform(-180, 180))
+            for place_id in range(1, 2001)
+        ]
+        snapshot = PlacesSnapshot(1, place_rows)
+        bboxes = ['-10,-10,10,10', '170,-60,190,60', '-190,0,-170,30', '-200,-90,200,90', '179.5,-85,180,85']
+        bboxes += [
+            f'{west},{south},{west + randomizer.uniform(0, 90)},{south + randomizer.uniform(0, 40)}'
+            for west, south in ((randomizer.uniform(-180, 180), randomizer.uniform(-85, 45)) for _ in range(20))
+        ]
+
+        for raw_bbox in bboxes:
+            west, south, east, north = bbox = parse_bbox(raw_bbox)
+            expected_ids = {
+                place_id
+                for place_id, _, latitude, longitude in place_rows
+                if south <= latitude <= north and (
+                    west <= longitude <= east if west <= east else longitude >= west or longitude <= east
+                )
+            }
+            with self.subTest(bbox=raw_bbox):
+                self.assertEqual({snapshot.ids[index] for index in snapshot.find_in_bbox(bbox)}, expected_ids)
+
+    def test_snapshot_follows_data_version(self):
+        place = self.create_place('Место', '55.75', '37.61')
+        snapshot = get_places_snapshot()
+        self.assertIs(get_places_snapshot(), snapshot)
+
+        place.title = 'Переименованное место'
+        self.save_place(place)
+
+        snapshot = get_places_snapshot()
+        self.assertEqual(list(snapshot.titles), ['Переименованное место'])
+        self.assertIn('Переименованное место'.encode('utf-8'), snapshot.dump_geojson())
+
+
+class NearbyPlacesTests(IsolatedStorageMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        randomizer = random.Random(20)
+        self.places = [
+            self.create_place(
+                f'Место {number}',
+                f'{55.75 + randomizer.uniform(-0.3, 0.3):.6f}',
+                f'{37.61 + randomizer.uniform(-0.5, 0.5):.6f}'
+            )
+            for number in range(80)
+        ]
+        self.places += [
+            self.create_place('Северный полюс', '89.999', '10'),
+            self.create_place('За полюсом', '89.995', '-90'),
+        ]
+
+    def brute_force_nearby(self, latitude, longitude, radius, limit):
+        places = sorted(
+            (get_distance(latitude, longitude, float(place.latitude), float(place.longitude)), place.id)
+            for place in self.places
+        )
+        return [(place_id, round(distance)) for distance, place_id in places if distance <= radius][:limit]
+
+    def get_nearby(self, latitude, longitude, radius, limit):
+        response = self.client.get(
+            reverse('places_nearby'), {'lat': latitude, 'lng': longitude, 'radius': radius, 'limit': limit}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (int(feature['properties']['placeId']), feature['properties']['distance'])
+            for feature in response.json()['features']
+        ]
+
+    def test_results_match_brute_force(self):
+        randomizer = random.Random(0)
+        points = [(55.75, 37.61), (89.999, 0), (90, 0)] + [
+            (55.75 + randomizer.uniform(-0.5, 0.5), 37.61 + randomizer.uniform(-0.8, 0.8)) for _ in range(10)
+        ]
+        for latitude, longitude in points:
+            for radius, limit in [(1000, 100), (5000, 100), (20000, 10), (50000, 100)]:
+                with self.subTest(latitude=latitude, longitude=longitude, radius=radius, limit=limit):
+                    self.assertEqual(
+                        self.get_nearby(latitude, longitude, radius, limit),
+                        self.brute_force_nearby(latitude, longitude, radius, limit)
+                    )
+
+    def test_moved_place_is_found_at_new_location(self):
+        place = self.places[0]
+        place.latitude, place.longitude = '-33.92', '18.42'
+        self.save_place(place)
+
+        self.assertEqual(self.get_nearby(-33.92, 18.42, 1000, 20), [(place.id, 0)])
+
+    def test_invalid_parameters(self):
+        url = reverse('places_nearby')
+        for params in [{'lat': '55'}, {'lat': '91', 'lng': '0'}, {'lat': '55', 'lng': '37', 'radius': '100000'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(url, params).status_code, 400)
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from .cache import get_data_version
+from .geo import get_grid_cell, get_tile_bbox
+from .models import Place
+from .serializers import serialize_feature_collection, serialize_place_feature
+
+
+MIN_ZOOM = 0
+MAX_ZOOM = 18
+
+TILES_FORMAT_VERSION = 1
+
+
+def get_tiles_root():
+    """Возвращает папку с тайлами текущей версии формата"""
+    return os.path.join(settings.PLACES_TILES_ROOT, f'v{TILES_FORMAT_VERSION}')
+
+
+def get_tile_path(zoom, tile_x, tile_y):
+    """Возвращает путь к файлу тайла в кэше на диске"""
+    return os.path.join(get_tiles_root(), str(zoom), str(tile_x), f'{tile_y}.geojson')
+
+
+def is_valid_tile(zoom, tile_x, tile_y):
+    """Проверяет, что тайл существует в сетке тайлов карты"""
+    if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+        return False
+    tiles_count = 2 ** zoom
+    return 0 <= tile_x < tiles_count and 0 <= tile_y < tiles_count
+
+
+def render_tile(zoom, tile_x, tile_y):
+    """Сериализует места, попадающие в тайл, в GeoJSON"""
+    west, south, east, north = get_tile_bbox(zoom, tile_x, tile_y)
+    places = Place.objects.filter(
+        latitude__gte=south,
+        latitude__lte=north,
+        longitude__gte=west,
+        longitude__lte=east
+    ).only('id', 'title', 'latitude', 'longitude')
+
+    features = [
+        serialize_place_feature(place)
+        for place in places
+        if get_grid_cell(float(place.latitude), float(place.longitude), 2 ** zoom) == (tile_x, tile_y)
+    ]
+    return json.dumps(
+        serialize_feature_collection(features),
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
+
+
+def get_tile(zoom, tile_x, tile_y):
+    """Возвращает GeoJSON тайла из кэша на диске, при необходимости рендерит его"""
+    tile_path = get_tile_path(zoom, tile_x, tile_y)
+    try:
+        with open(tile_path, 'rb') as tile_file:
+            return tile_file.read()
+    except FileNotFoundError:
+        pass
+
+    version = get_data_version()
+    content = render_tile(zoom, tile_x, tile_y)
+
+    tile_dir = os.path.dirname(tile_path)
+    os.makedirs(tile_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=tile_dir, suffix='.tmp', delete=False) as tmp_file:
+        tmp_file.write(content)
+    os.replace(tmp_file.name, tile_path)
+
+    # Места изменились, пока тайл рендерился: он мог быть собран из старых данных
+    if get_data_version() != version:
+        _remove_tile(tile_path)
+
+    return content
+
+
+def invalidate_tiles(latitude, longitude):
+    """Удаляет из кэша тайлы всех уровней масштаба, содержащие точку"""
+    latitude, longitude = float(latitude), float(longitude)
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        tile_x, tile_y = get_grid_cell(latitude, longitude, 2 ** zoom)
+        _remove_tile(get_tile_path(zoom, tile_x, tile_y))
+
+
+def clear_tiles():
+    """Удаляет из кэша все тайлы"""
+    shutil.rmtree(get_tiles_root(), ignore_errors=True)
+
+
+def _remove_tile(tile_path):
+    try:
+        os.remove(tile_path)
+    except FileNotFoundError:
+        pass
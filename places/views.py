@@ -1,69 +1,369 @@
-import urllib.parse
+import hmac
 
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, render
-from django.urls import reverse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import (
+    get_conditional_response,
+    patch_response_headers,
+    patch_vary_headers,
+    set_response_etag,
+)
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 
+from . import clusters, metrics, nearby, search, tiles
+from .cache import (
+    aget_place_details_payload,
+    get_data_last_modified,
+    get_data_version_etag,
+    get_place_details_payload,
+    get_places_details_payloads,
+    get_process_payload,
+)
+from .compression import choose_encoding
+from .geo import parse_bbox
 from .models import Place
+from .registry import get_all_places_geojson_payload, get_places_snapshot
+from .serializers import (
+    aiter_places_geojson,
+    iter_places_geojson,
+    serialize_cluster_feature,
+    serialize_feature_collection,
+    serialize_nearby_place_feature,
+    serialize_search_result_feature,
+)
 
 
+def _render_map_page():
+    return render_to_string('index.html', {
+        'places_details_batch_limit': settings.PLACES_DETAILS_BATCH_LIMIT
+    }).encode('utf-8')
+
+
+def _get_map_page():
+    return get_process_payload('map_page', _render_map_page)
+
+
+def _get_map_page_etag(request):
+    return _get_map_page()['etag']
+
+
+def _get_place_details(place_id):
+    payload = get_place_details_payload(place_id)
+    if payload is None:
+        raise Http404('Место не найдено')
+    return payload
+
+
+def _get_place_details_etag(request, place_id):
+    return _get_place_details(place_id)['etag']
+
+
+def _make_payload_response(request, payload, etag, content_type=None):
+    """Отдает payload, выбирая его заранее сжатую копию по заголовку Accept-Encoding"""
+    encodings = payload.get('encodings', {})
+    encoding = choose_encoding(request, encodings)
+
+    response = HttpResponse(
+        encodings[encoding] if encoding else payload['content'],
+        content_type=content_type
+    )
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if encoding:
+        response['Content-Encoding'] = encoding
+        # Сжатая копия побайтово отличается от исходной, поэтому её ETag слабый
+        response['ETag'] = f'W/{quote_etag(etag)}'
+    return response
+
+
+def _make_conditional_payload_response(request, payload, content_type=None):
+    """Отдает payload или 304 Not Modified, как декоратор condition, но без синхронных вызовов"""
+    # Декоратор condition вызывает функции ETag синхронно даже для асинхронных представлений
+    etag = quote_etag(payload['etag'])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = _make_payload_response(request, payload, payload['etag'], content_type=content_type)
+
+    response.headers.setdefault('ETag', etag)
+    return response
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=_get_map_page_etag)
 def get_places_map(request):
-    """Получает данные всех мест из БД и отображает карту с метками"""
-    places = Place.objects.all()
+    """Отображает карту, метки на которую подгружаются по видимой области"""
+    page = _get_map_page()
+    return _make_payload_response(request, page, page['etag'])
+
+
+@cache_control(no_cache=True)
+async def aget_places_map(request):
+    """Асинхронная версия get_places_map для запуска под ASGI"""
+    return _make_conditional_payload_response(request, _get_map_page())
+
+
+@gzip_page
+@cache_control(no_cache=True)
+@condition(etag_func=get_data_version_etag, last_modified_func=get_data_last_modified)
+def get_places_geojson(request):
+    """Возвращает GeoJSON мест в запрошенной области карты или всех мест, если область не указана"""
+    if 'bbox' not in request.GET:
+        return _make_payload_response(
+            request,
+            get_all_places_geojson_payload(),
+            get_data_version_etag(request),
+            content_type='application/json'
+        )
+
+    try:
+        bbox = parse_bbox(request.GET['bbox'])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return _make_places_in_bbox_response(bbox)
+
+
+@cache_control(no_cache=True)
+@condition(etag_func=get_data_version_etag, last_modified_func=get_data_last_modified)
+def export_places_geojson(request):
+    """Отдает GeoJSON всех мест потоком, читая места из базы порциями"""
+    places = Place.objects.order_by('id')
+    fields = ('id', 'title', 'latitude', 'longitude')
+    chunk_size = settings.PLACES_EXPORT_CHUNK_SIZE
+
+    # Под ASGI Django читает синхронный итератор ответа целиком в память через
+    # sync_to_async(list), а под WSGI так же поступает с асинхронным, поэтому
+    # тип итератора выбирается по серверу, обслуживающему запрос. named=True
+    # нужен потому, что для обычного values_list aiterator() в Django 5.2
+    # выполняет запрос в потоке цикла событий и падает с SynchronousOnlyOperation.
+    if isinstance(request, ASGIRequest):
+        content = aiter_places_geojson(
+            places.values_list(*fields, named=True).aiterator(chunk_size=chunk_size)
+        )
+    else:
+        content = iter_places_geojson(places.values_list(*fields).iterator(chunk_size=chunk_size))
+
+    response = StreamingHttpResponse(content, content_type='application/geo+json')
+    response['Content-Disposition'] = 'attachment; filename="places.geojson"'
+    return response
+
+
+@gzip_page
+@cache_control(no_cache=True)
+@condition(etag_func=get_data_version_etag, last_modified_func=get_data_last_modified)
+def get_place_clusters(request):
+    """Возвращает кластеры меток для видимой области карты и уровня масштаба"""
+    try:
+        bbox = parse_bbox(request.GET.get('bbox', ''))
+        zoom = _parse_zoom(request.GET.get('zoom', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if zoom > clusters.MAX_ZOOM:
+        return _make_places_in_bbox_response(bbox)
+
     features = [
-        {
-            'type': 'Feature',
-            'geometry': {
-                'type': 'Point',
-                'coordinates': [float(place.longitude), float(place.latitude)]
-            },
-            'properties': {
-                'title': place.title,
-                'placeId': str(place.id),
-                'detailsUrl': reverse('place_details', kwargs={'place_id': place.id})
-            }
-        }
-        for place in places
+        serialize_cluster_feature(cluster)
+        for cluster in clusters.get_clusters_in_bbox(bbox, zoom)
     ]
-    
-    places_geojson = {
-        'type': 'FeatureCollection',
-        'features': features
-    }
-    
-    return render(request, 'index.html', {
-        'places_geojson': places_geojson
-    })
+
+    return JsonResponse(
+        serialize_feature_collection(features),
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def get_places_tile(request, zoom, tile_x, tile_y):
+    """Возвращает GeoJSON мест тайла карты из кэша на диске"""
+    if not tiles.is_valid_tile(zoom, tile_x, tile_y):
+        raise Http404('Тайл не найден')
+
+    response = HttpResponse(
+        tiles.get_tile(zoom, tile_x, tile_y),
+        content_type='application/geo+json'
+    )
+    set_response_etag(response)
+    patch_response_headers(response, cache_timeout=settings.PLACES_TILES_CACHE_TIMEOUT)
+
+    return get_conditional_response(request, etag=response['ETag'], response=response)
 
 
+@cache_control(no_cache=True)
+@condition(etag_func=_get_place_details_etag)
 def get_place_details_json(request, place_id):
     """Возвращает JSON данные о конкретном месте по его ID"""
-    place = get_object_or_404(
-        Place.objects.prefetch_related('images'), 
-        id=place_id
+    payload = _get_place_details(place_id)
+    return _make_payload_response(request, payload, payload['etag'], content_type='application/json')
+
+
+@cache_control(no_cache=True)
+async def aget_place_details_json(request, place_id):
+    """Асинхронная версия get_place_details_json для запуска под ASGI"""
+    payload = await aget_place_details_payload(place_id)
+    if payload is None:
+        raise Http404('Место не найдено')
+    return _make_conditional_payload_response(request, payload, content_type='application/json')
+
+
+@gzip_page
+def get_places_details_json(request):
+    """Возвращает JSON с деталями нескольких мест по списку ID в параметре ids"""
+    try:
+        place_ids = _parse_place_ids(request.GET.get('ids', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    payloads = get_places_details_payloads(place_ids)
+    content = b'{' + b','.join(
+        b'"%d":%s' % (place_id, payloads[place_id]['content'])
+        for place_id in place_ids
+        if place_id in payloads
+    ) + b'}'
+
+    return HttpResponse(content, content_type='application/json')
+
+
+@gzip_page
+@cache_control(no_cache=True)
+@condition(etag_func=get_data_version_etag, last_modified_func=get_data_last_modified)
+def search_places_json(request):
+    """Возвращает GeoJSON мест, найденных полнотекстовым поиском, по убыванию релевантности"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Укажите поисковый запрос в параметре q'}, status=400)
+
+    try:
+        limit = _parse_search_limit(request.GET.get('limit', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    results = search.search_places(query, limit)
+    places = Place.objects.only('id', 'title', 'latitude', 'longitude').in_bulk(
+        [place_id for place_id, _ in results]
     )
-    
-    image_urls = [
-        urllib.parse.unquote(image.image.url) 
-        for image in place.images.all() 
-        if image.image
+    features = [
+        serialize_search_result_feature(places[place_id], snippet)
+        for place_id, snippet in results
+        if place_id in places
     ]
-    
-    serialized_place = {
-        'title': place.title,
-        'imgs': image_urls,
-        'description_short': place.short_description,
-        'description_long': place.long_description,
-        'coordinates': {
-            'lng': str(place.longitude),
-            'lat': str(place.latitude)
-        }
-    }
-    
+
     return JsonResponse(
-        serialized_place,
-        json_dumps_params={
-            'ensure_ascii': False,
-            'indent': 2
-        }
+        serialize_feature_collection(features),
+        json_dumps_params={'ensure_ascii': False}
     )
+
+
+@gzip_page
+@cache_control(no_cache=True)
+@condition(etag_func=get_data_version_etag, last_modified_func=get_data_last_modified)
+def get_nearby_places_json(request):
+    """Возвращает GeoJSON мест в радиусе от точки, отсортированных по расстоянию"""
+    try:
+        latitude, longitude = _parse_point(request.GET.get('lat', ''), request.GET.get('lng', ''))
+        radius = _parse_bounded_number(
+            request.GET.get('radius', ''), 'radius', nearby.DEFAULT_NEARBY_RADIUS, nearby.MAX_NEARBY_RADIUS
+        )
+        limit = _parse_bounded_number(
+            request.GET.get('limit', ''), 'limit', nearby.DEFAULT_NEARBY_LIMIT, nearby.MAX_NEARBY_LIMIT
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    features = [
+        serialize_nearby_place_feature(place, distance)
+        for place, distance in nearby.find_nearby_places(latitude, longitude, radius, limit)
+    ]
+
+    return JsonResponse(
+        serialize_feature_collection(features),
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def get_metrics(request):
+    """Отдает метрики запросов процесса в текстовом формате Prometheus; доступно только с токеном METRICS_TOKEN"""
+    # Проверка по REMOTE_ADDR не подходит: за обратным прокси все запросы
+    # приходят с его адреса, и страница оказалась бы открыта всем.
+    if not settings.METRICS_ENABLED or not settings.METRICS_TOKEN:
+        raise Http404('Страница не найдена')
+
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip(), settings.METRICS_TOKEN):
+        raise Http404('Страница не найдена')
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _make_places_in_bbox_response(bbox):
+    snapshot = get_places_snapshot()
+    return HttpResponse(
+        snapshot.dump_geojson(snapshot.find_in_bbox(bbox)),
+        content_type='application/json'
+    )
+
+
+def _parse_zoom(raw_zoom):
+    try:
+        zoom = int(raw_zoom)
+    except ValueError:
+        raise ValueError('zoom должен быть целым числом')
+
+    if zoom < 0:
+        raise ValueError('zoom не может быть отрицательным')
+    return zoom
+
+
+def _parse_place_ids(raw_place_ids):
+    try:
+        place_ids = list(dict.fromkeys(int(place_id) for place_id in raw_place_ids.split(',')))
+    except ValueError:
+        raise ValueError('ids должен содержать список целых чисел через запятую')
+
+    if len(place_ids) > settings.PLACES_DETAILS_BATCH_LIMIT:
+        raise ValueError(f'Можно запросить не больше {settings.PLACES_DETAILS_BATCH_LIMIT} мест за раз')
+    return place_ids
+
+
+def _parse_search_limit(raw_limit):
+    if not raw_limit:
+        return search.DEFAULT_SEARCH_LIMIT
+
+    try:
+        limit = int(raw_limit)
+    except ValueError:
+        raise ValueError('limit должен быть целым числом')
+
+    if not 1 <= limit <= search.MAX_SEARCH_LIMIT:
+        raise ValueError(f'limit должен быть от 1 до {search.MAX_SEARCH_LIMIT}')
+    return limit
+
+
+def _parse_point(raw_latitude, raw_longitude):
+    try:
+        latitude = float(raw_latitude)
+        longitude = float(raw_longitude)
+    except ValueError:
+        raise ValueError('lat и lng должны быть числами')
+
+    if not -90 <= latitude <= 90:
+        raise ValueError('lat должен быть от -90 до 90')
+    if not -180 <= longitude <= 180:
+        raise ValueError('lng должен быть от -180 до 180')
+    return latitude, longitude
+
+
+def _parse_bounded_number(raw_number, name, default, maximum):
+    if not raw_number:
+        return default
+
+    try:
+        number = int(raw_number)
+    except ValueError:
+        raise ValueError(f'{name} должен быть целым числом')
+
+    if not 1 <= number <= maximum:
+        raise ValueError(f'{name} должен быть от 1 до {maximum}')
+    return number
@@ -0,0 +1,8 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'where_to_go.settings')
+os.environ.setdefault('ASGI', 'True')
+
+application = get_asgi_application()
@@ -38,6 +38,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+METRICS_TOKEN = env.str('METRICS_TOKEN', '')
+METRICS_ENABLED = env.bool('METRICS_ENABLED', bool(METRICS_TOKEN))
+METRICS_SLOW_REQUEST_MS = env.int('METRICS_SLOW_REQUEST_MS', 0)
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'places.middleware.RequestMetricsMiddleware')
+
 if DEBUG:
     MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
 
@@ -61,6 +68,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'where_to_go.wsgi.application'
 
+ASGI_APPLICATION = 'where_to_go.asgi.application'
+
+# Включается в where_to_go/asgi.py: под ASGI карта и детали мест обслуживаются
+# асинхронными представлениями, а постоянные соединения с базой отключены
+ASGI = env.bool('ASGI', False)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -68,6 +81,66 @@ DATABASES = {
     }
 }
 
+# Профиль SQLite для продакшена: WAL не дает долгим транзакциям импорта блокировать
+# чтение, а постоянные соединения избавляют от открытия базы на каждый запрос.
+SQLITE_TUNING = env.bool('SQLITE_TUNING', True)
+
+SQLITE_PRAGMAS = {
+    'journal_mode': env.str('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': env.str('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+    'cache_size': env.int('SQLITE_CACHE_SIZE', -64 * 1024),
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', 5000),
+}
+
+if SQLITE_TUNING:
+    DATABASES['default'].update({
+        # Под ASGI соединение привязано к потоку или задаче, которые после
+        # запроса не переиспользуются, поэтому постоянные соединения копились бы
+        'CONN_MAX_AGE': env.int('DATABASE_CONN_MAX_AGE', 0 if ASGI else 600),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    })
+
+# Собранные ответы хранятся в памяти каждого процесса: файловый кэш при каждой
+# записи пересчитывает все свои файлы, и с ростом каталога запись дорожает.
+# Чтобы процессы делили ответы между собой, укажите Redis или Memcached.
+CACHE_BACKEND = env.str('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+STATE_CACHE_BACKEND = env.str('STATE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': env.str('CACHE_LOCATION', 'places'),
+    },
+    # Общее для всех процессов состояние: версия данных и поколения деталей мест.
+    # Записей здесь немного, и чистка не должна их удалять, поэтому лимит высокий.
+    'places_state': {
+        'BACKEND': STATE_CACHE_BACKEND,
+        'LOCATION': env.str('STATE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'state')),
+        'TIMEOUT': None,
+    },
+}
+
+# Лимит записей есть только у файлового кэша и кэша в памяти
+LIMITED_CACHE_BACKENDS = ('FileBasedCache', 'LocMemCache')
+
+if CACHE_BACKEND.endswith(LIMITED_CACHE_BACKENDS):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', 2000)}
+
+if STATE_CACHE_BACKEND.endswith(LIMITED_CACHE_BACKENDS):
+    CACHES['places_state']['OPTIONS'] = {'MAX_ENTRIES': env.int('STATE_CACHE_MAX_ENTRIES', 100000)}
+
+PLACES_CACHE_TIMEOUT = env.int('PLACES_CACHE_TIMEOUT', 24 * 60 * 60)
+
+PLACES_DETAILS_BATCH_LIMIT = env.int('PLACES_DETAILS_BATCH_LIMIT', 100)
+
+PLACES_EXPORT_CHUNK_SIZE = env.int('PLACES_EXPORT_CHUNK_SIZE', 2000)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,5 +175,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+PLACES_TILES_ROOT = env.str('PLACES_TILES_ROOT', os.path.join(BASE_DIR, 'tiles'))
+PLACES_TILES_CACHE_TIMEOUT = env.int('PLACES_TILES_CACHE_TIMEOUT', 60)
+
+PLACES_IMAGE_VARIANTS_WORKERS = env.int('PLACES_IMAGE_VARIANTS_WORKERS', os.cpu_count() or 1)
+
 if DEBUG:
     INTERNAL_IPS = ['127.0.0.1']
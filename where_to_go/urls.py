@@ -5,10 +5,30 @@ from django.urls import include, path
 
 from places import views as places_views
 
+# Под WSGI асинхронные представления выполнялись бы через async_to_sync
+if settings.ASGI:
+    get_places_map = places_views.aget_places_map
+    get_place_details_json = places_views.aget_place_details_json
+else:
+    get_places_map = places_views.get_places_map
+    get_place_details_json = places_views.get_place_details_json
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', places_views.get_places_map, name='main'),
-    path('places/<int:place_id>/', places_views.get_place_details_json, name='place_details'),
+    path('', get_places_map, name='main'),
+    path('places/geojson/', places_views.get_places_geojson, name='places_geojson'),
+    path('places/export.geojson', places_views.export_places_geojson, name='places_export'),
+    path('places/clusters/', places_views.get_place_clusters, name='place_clusters'),
+    path('places/nearby/', places_views.get_nearby_places_json, name='places_nearby'),
+    path('places/search/', places_views.search_places_json, name='places_search'),
+    path('places/details/', places_views.get_places_details_json, name='places_details'),
+    path('places/<int:place_id>/', get_place_details_json, name='place_details'),
+    path(
+        'tiles/<int:zoom>/<int:tile_x>/<int:tile_y>.geojson',
+        places_views.get_places_tile,
+        name='places_tile'
+    ),
+    path('metrics', places_views.get_metrics, name='metrics'),
     path('tinymce/', include('tinymce.urls')),
 ]
 